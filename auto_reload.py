@@ -1,69 +1,303 @@
 #!/usr/bin/env python3
 """
-Simple auto-reload script for Everly development
+Auto-reload development server for Everly.
+
+Watches the project sources with watchdog (inotify, FSEvents or
+ReadDirectoryChangesW) and restarts only the process whose code changed.
+In the default ``http`` server mode the MCP server runs as its own process
+over streamable HTTP and the UI reaches it through ``EVERLY_MCP_URL``, so
+editing server code restarts the server while the UI stays up, and editing
+UI code restarts only the UI. Which process a file belongs to is worked out
+from the local imports of ``main.py`` and ``mcp_server.py``.
+
+Usage:
+    python auto_reload.py [--include GLOB ...] [--exclude GLOB ...]
+                          [--debounce SECONDS] [--server http|stdio] [--port PORT]
+                          [--hot-reload]
 """
 
+from __future__ import annotations
+
+import argparse
+import ast
+import fnmatch
 import os
-import sys
-import time
 import subprocess
+import sys
 import threading
 from pathlib import Path
+from typing import Iterable, Optional
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+UI_ENTRY = PROJECT_ROOT / "main.py"
+SERVER_ENTRY = PROJECT_ROOT / "mcp_server.py"
+UI_MODULE = PROJECT_ROOT / "ui.py"
+
+# train_static/ is left out: reference_assets swaps changed files in without a restart.
+DEFAULT_INCLUDE = ("*.py", ".env")
+DEFAULT_EXCLUDE = (
+    ".git/*",
+    "*/__pycache__/*",
+    "__pycache__/*",
+    ".everly_cache/*",
+    "benchmarks/*",
+    "auto_reload.py",
+    # Editor swap, backup and lock files
+    "*.swp",
+    "*.swx",
+    "*~",
+    ".#*",
+    "*.tmp",
+)
+DEFAULT_DEBOUNCE = 0.3
+DEFAULT_PORT = 8765
+
+
+def matches(relative: str, patterns: Iterable[str]) -> bool:
+    """Match a project-relative POSIX path against globs; slash-free globs also match the file name."""
+    name = relative.rsplit("/", 1)[-1]
+    return any(
+        fnmatch.fnmatch(relative, pattern) or ("/" not in pattern and fnmatch.fnmatch(name, pattern))
+        for pattern in patterns
+    )
+
+
+def local_import_closure(entry: Path, root: Path = PROJECT_ROOT) -> set[Path]:
+    """Project modules ``entry`` imports, directly or transitively, including itself."""
+    seen: set[Path] = set()
+    pending = [entry.resolve()]
+    while pending:
+        path = pending.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.add(path)
+        try:
+            tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            # A half-written file still belongs to the process; its imports are picked up next time.
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = root / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    pending.append(candidate.resolve())
+    return seen
+
+
+class ManagedProcess:
+    """A child process that can be restarted on demand."""
+
+    def __init__(self, name: str, command: list[str], env: Optional[dict[str, str]] = None):
+        self.name = name
+        self.command = command
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        print(f"🚀 Starting {self.name}...")
+        self.process = subprocess.Popen(self.command, cwd=PROJECT_ROOT, env=self.env)
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def restart(self):
+        print(f"🔄 Restarting {self.name}...")
+        self.stop()
+        self.start()
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """Collects matching paths and hands them to the reloader once a save burst has settled."""
+
+    def __init__(self, reloader: "AutoReloader"):
+        self.reloader = reloader
+        self._pending: set[Path] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        # Editors that save atomically write a temp file and rename it over the original.
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        relevant = [Path(path) for path in paths if path and self.reloader.is_watched(Path(path))]
+        if not relevant:
+            return
+        with self._lock:
+            self._pending.update(relevant)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.reloader.debounce, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            paths, self._pending = self._pending, set()
+            self._timer = None
+        if paths:
+            self.reloader.apply_changes(paths)
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
 
 class AutoReloader:
-    def __init__(self):
-        self.process = None
-        self.last_modified = 0
-        self.ui_file = Path("ui.py")
-        self.start_app()
-    
-    def start_app(self):
-        """Start the main application."""
-        if self.process:
-            print("🔄 Stopping previous instance...")
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-        
-        print("🚀 Starting Everly application...")
-        self.process = subprocess.Popen([sys.executable, "main.py"])
-    
-    def check_for_changes(self):
-        """Check if ui.py has been modified."""
-        if self.ui_file.exists():
-            current_modified = self.ui_file.stat().st_mtime
-            if current_modified > self.last_modified:
-                self.last_modified = current_modified
-                print(f"📝 Detected change in ui.py")
-                print("🔄 Reloading application...")
-                self.start_app()
-    
+    def __init__(
+        self,
+        include: Iterable[str] = DEFAULT_INCLUDE,
+        exclude: Iterable[str] = DEFAULT_EXCLUDE,
+        debounce: float = DEFAULT_DEBOUNCE,
+        server_mode: str = "http",
+        port: int = DEFAULT_PORT,
+        hot_reload: bool = False,
+    ):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.debounce = debounce
+        self.server_mode = server_mode
+        self.hot_reload = hot_reload
+        self._restart_lock = threading.Lock()
+
+        ui_env = dict(os.environ)
+        self.server: Optional[ManagedProcess] = None
+        if server_mode == "http":
+            self.server = ManagedProcess(
+                "MCP server",
+                [sys.executable, str(SERVER_ENTRY), "--transport", "streamable-http", "--port", str(port)],
+            )
+            ui_env["EVERLY_MCP_URL"] = f"http://127.0.0.1:{port}/mcp"
+        else:
+            # Spawn the stdio server per call so server edits apply on the next call.
+            ui_env["EVERLY_MCP_PERSISTENT"] = "0"
+        ui_command = [sys.executable, str(UI_ENTRY)]
+        if hot_reload:
+            # ui.py is reloaded inside the running app; other UI modules still restart it.
+            ui_command.append("--hot-reload")
+        self.ui = ManagedProcess("Everly application", ui_command, ui_env)
+
+    def is_watched(self, path: Path) -> bool:
+        try:
+            relative = path.resolve().relative_to(PROJECT_ROOT).as_posix()
+        except ValueError:
+            return False
+        return matches(relative, self.include) and not matches(relative, self.exclude)
+
+    def affected_processes(self, paths: Iterable[Path]) -> list[ManagedProcess]:
+        """Processes to restart for ``paths``; non-Python files (``.env``) affect both."""
+        ui_modules = local_import_closure(UI_ENTRY)
+        server_modules = local_import_closure(SERVER_ENTRY)
+        restart_ui = restart_server = False
+        for path in paths:
+            path = path.resolve()
+            if path.suffix != ".py":
+                restart_ui = restart_server = True
+                continue
+            restart_ui |= path in ui_modules and not (self.hot_reload and path == UI_MODULE)
+            restart_server |= path in server_modules
+
+        affected = []
+        if restart_server and self.server is not None:
+            affected.append(self.server)
+        if restart_ui:
+            affected.append(self.ui)
+        return affected
+
+    def apply_changes(self, paths: set[Path]):
+        names = ", ".join(sorted(path.resolve().relative_to(PROJECT_ROOT).as_posix() for path in paths))
+        print(f"📝 Detected change in {names}")
+        affected = self.affected_processes(paths)
+        if not affected:
+            if self.hot_reload and UI_MODULE in {path.resolve() for path in paths}:
+                print("♻️  ui.py is reloaded inside the running app.")
+            elif self.server is None:
+                print("ℹ️  Not loaded by the UI; server changes are picked up on the next tool call.")
+            else:
+                print("ℹ️  Not loaded by the UI or the MCP server, nothing to restart.")
+            return
+        with self._restart_lock:
+            for process in affected:
+                process.restart()
+
     def run(self):
-        """Main loop to watch for changes."""
+        """Start the processes and watch for changes until Ctrl+C."""
         print("🔧 Everly Auto-Reload Development Server")
-        print("📁 Watching for changes in ui.py...")
+        print(f"📁 Watching {', '.join(self.include)} (excluding {', '.join(self.exclude)})")
         print("⏹️  Press Ctrl+C to stop")
         print("-" * 50)
-        
+
+        if self.server is not None:
+            self.server.start()
+        self.ui.start()
+
+        handler = _ChangeHandler(self)
+        observer = Observer()
+        observer.schedule(handler, str(PROJECT_ROOT), recursive=True)
+        observer.start()
         try:
-            while True:
-                self.check_for_changes()
-                time.sleep(1)  # Check every second
+            while observer.is_alive():
+                observer.join(timeout=1)
         except KeyboardInterrupt:
             print("\n⏹️  Stopping development server...")
-            if self.process:
-                self.process.terminate()
-                try:
-                    self.process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.process.kill()
+        finally:
+            handler.cancel()
+            observer.stop()
+            observer.join()
+            with self._restart_lock:
+                self.ui.stop()
+                if self.server is not None:
+                    self.server.stop()
+
 
 def main():
     """Main entry point."""
-    reloader = AutoReloader()
+    parser = argparse.ArgumentParser(description="Restart Everly processes when their sources change")
+    parser.add_argument("--include", nargs="+", default=list(DEFAULT_INCLUDE), help="globs to watch")
+    parser.add_argument(
+        "--exclude", nargs="+", default=[], help="extra globs to ignore (added to the defaults)"
+    )
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="seconds to wait for a save burst to settle")
+    parser.add_argument(
+        "--server",
+        choices=("http", "stdio"),
+        default="http",
+        help="http: run the MCP server separately so it can restart on its own; stdio: spawn it per call",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port for the HTTP MCP server")
+    parser.add_argument(
+        "--hot-reload", action="store_true", help="reload ui.py inside the running app instead of restarting it"
+    )
+    args = parser.parse_args()
+
+    reloader = AutoReloader(
+        include=args.include,
+        exclude=DEFAULT_EXCLUDE + tuple(args.exclude),
+        debounce=args.debounce,
+        server_mode=args.server,
+        port=args.port,
+        hot_reload=args.hot_reload,
+    )
     reloader.run()
 
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
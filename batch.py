@@ -0,0 +1,273 @@
+"""Headless batch runner: answer a JSONL queue of questions without the Qt UI.
+
+Each input line is a job::
+
+    {"id": "w1-legs", "question": "What day is the leg workout?", "image": "shots/week1.png"}
+
+``tool`` defaults to ``screenshot_analysis``; the others are
+``extract_training_calendar``, ``schedule_workout`` (``date`` or ``question``)
+and ``send_message_to_client`` (``message`` or ``question``). ``image`` is a
+saved screenshot, relative to the jobs file. It is handed to the MCP server
+through shared memory, so no display is needed. Jobs without an image
+capture the live screen. With ``--backend langchain`` each question goes to
+the LangChain agent, which picks its own tool.
+
+Results are streamed to the output JSONL as jobs finish, with per-job
+timings. Rerunning with the same output skips jobs already recorded, so an
+interrupted run resumes where it stopped (``--retry-errors`` reruns failures).
+
+Usage:
+    python batch.py JOBS.jsonl [-o results.jsonl] [--concurrency 4]
+                    [--backend mcp|langchain] [--timings timings.csv] [--retry-errors]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from dotenv import load_dotenv
+
+
+TOOLS = ("screenshot_analysis", "extract_training_calendar", "schedule_workout", "send_message_to_client")
+BACKENDS = ("mcp", "langchain")
+
+# Agents report failures as text rather than raising.
+ERROR_PREFIXES = ("Error", "❌", "OPENAI_API_KEY is not configured", "OpenAI is failing", "OpenAI is recovering")
+
+
+@dataclass
+class Job:
+    id: str
+    tool: str
+    question: str = ""
+    image: Optional[Path] = None
+    date: Optional[str] = None
+    message: Optional[str] = None
+
+
+def read_jobs(path: Path) -> Iterator[Job]:
+    """Parse the jobs file; ``ValueError`` names the offending line."""
+    with path.open(encoding="utf-8") as handle:
+        for number, line in enumerate(handle, start=1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{number}: invalid JSON: {exc}") from exc
+
+            tool = record.get("tool", "screenshot_analysis")
+            if tool not in TOOLS:
+                raise ValueError(f"{path}:{number}: unknown tool {tool!r}, expected one of {', '.join(TOOLS)}")
+            image = record.get("image")
+            job = Job(
+                id=str(record.get("id", f"line-{number}")),
+                tool=tool,
+                question=record.get("question", ""),
+                image=(path.parent / image) if image else None,
+                date=record.get("date"),
+                message=record.get("message"),
+            )
+            if tool == "screenshot_analysis" and not job.question:
+                raise ValueError(f"{path}:{number}: screenshot_analysis needs a question")
+            yield job
+
+
+def completed_job_ids(path: Path, retry_errors: bool) -> set[str]:
+    """IDs already in an earlier output file; the last record per ID wins."""
+    if not path.exists():
+        return set()
+    statuses: dict[str, str] = {}
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted write; that job runs again.
+                continue
+            statuses[str(record.get("id"))] = record.get("status", "ok")
+    return {job_id for job_id, status in statuses.items() if not (retry_errors and status == "error")}
+
+
+class _Runner:
+    """Runs jobs on one backend; agents are per thread since their tools hold per-call state."""
+
+    def __init__(self, backend: str) -> None:
+        self.backend = backend
+        self._local = threading.local()
+
+    def _agent(self) -> Any:
+        agent = getattr(self._local, "agent", None)
+        if agent is None:
+            if self.backend == "langchain":
+                from langchain_agent import FloatingAppAgent
+
+                agent = FloatingAppAgent()
+            else:
+                from mcp_client import EverlyAgent
+
+                agent = EverlyAgent()
+            self._local.agent = agent
+        return agent
+
+    def run(self, job: Job) -> str:
+        agent = self._agent()
+        if self.backend == "langchain":
+            return agent.analyze_screenshot_with_question(
+                job.question, image_path=str(job.image) if job.image else None
+            )
+
+        if job.tool == "schedule_workout":
+            return agent.schedule_workout(job.date or job.question)
+        if job.tool == "send_message_to_client":
+            return agent.send_message_to_client(job.message or job.question)
+        if job.image is None:
+            if job.tool == "extract_training_calendar":
+                return agent.extract_training_calendar()
+            return agent.analyze_screenshot_with_question(job.question)
+
+        from PIL import Image
+
+        with Image.open(job.image) as image:
+            image.load()
+            if job.tool == "extract_training_calendar":
+                return agent.extract_training_calendar_from_frame(image)
+            return agent.analyze_frame_with_question(job.question, image)
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(rank / 100 * len(ordered)) - 1))]
+
+
+def run_batch(
+    jobs_path: Path,
+    output_path: Path,
+    concurrency: int = 4,
+    backend: str = "mcp",
+    timings_path: Optional[Path] = None,
+    retry_errors: bool = False,
+) -> dict[str, Any]:
+    """Run every pending job, appending one result line per job; return a summary."""
+    done = completed_job_ids(output_path, retry_errors)
+    all_jobs = list(read_jobs(jobs_path))
+    jobs = [job for job in all_jobs if job.id not in done]
+    skipped = len(all_jobs) - len(jobs)
+    runner = _Runner(backend)
+
+    lock = threading.Lock()
+    latencies: list[float] = []
+    errors = 0
+    batch_started = time.perf_counter()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    timings_file = None
+    timings_writer = None
+    if timings_path is not None:
+        new_file = not timings_path.exists()
+        timings_file = timings_path.open("a", newline="", encoding="utf-8")
+        timings_writer = csv.writer(timings_file)
+        if new_file:
+            timings_writer.writerow(["id", "tool", "worker", "start_offset_s", "latency_s", "status"])
+
+    def execute(job: Job) -> None:
+        nonlocal errors
+        started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        offset = time.perf_counter() - batch_started
+        started = time.perf_counter()
+        try:
+            answer = runner.run(job)
+            status = "error" if answer.startswith(ERROR_PREFIXES) else "ok"
+        except Exception as exc:  # one bad job must not stop the batch
+            answer, status = f"{type(exc).__name__}: {exc}", "error"
+        latency = time.perf_counter() - started
+        worker = threading.current_thread().name
+
+        record = {
+            "id": job.id,
+            "tool": job.tool,
+            "question": job.question,
+            "image": str(job.image) if job.image else None,
+            "status": status,
+            "answer": answer,
+            "backend": backend,
+            "started_at": started_at,
+            "latency_s": round(latency, 3),
+            "worker": worker,
+        }
+        with lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if timings_writer is not None:
+                timings_writer.writerow([job.id, job.tool, worker, f"{offset:.3f}", f"{latency:.3f}", status])
+                timings_file.flush()
+            latencies.append(latency)
+            errors += status == "error"
+            print(f"[{len(latencies)}/{len(jobs)}] {job.id}: {status} in {latency:.2f}s", file=sys.stderr)
+
+    with output_path.open("a", encoding="utf-8") as output:
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+        pending: set[Future] = set()
+        try:
+            # Submit lazily so an interrupt leaves unstarted jobs for the next run.
+            for job in jobs:
+                pending.add(executor.submit(execute, job))
+                if len(pending) >= concurrency:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            wait(pending)
+        except KeyboardInterrupt:
+            print("Interrupted; finishing running jobs. Rerun to resume.", file=sys.stderr)
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if timings_file is not None:
+                timings_file.close()
+
+    wall = time.perf_counter() - batch_started
+    summary: dict[str, Any] = {
+        "jobs": len(latencies),
+        "errors": errors,
+        "skipped": skipped,
+        "wall_s": round(wall, 3),
+        "jobs_per_min": round(len(latencies) / wall * 60, 2) if wall and latencies else 0.0,
+    }
+    if latencies:
+        summary["p50_s"] = round(percentile(latencies, 50), 3)
+        summary["p95_s"] = round(percentile(latencies, 95), 3)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run Everly over a JSONL file of questions without the UI")
+    parser.add_argument("jobs", type=Path, help="input JSONL, one job per line")
+    parser.add_argument("-o", "--output", type=Path, help="results JSONL (default: <jobs>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--backend", choices=BACKENDS, default="mcp")
+    parser.add_argument("--timings", type=Path, help="also append per-job timings to this CSV")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun jobs whose last result was an error")
+    args = parser.parse_args()
+
+    load_dotenv()
+    output = args.output or args.jobs.with_suffix(".results.jsonl")
+    try:
+        summary = run_batch(args.jobs, output, args.concurrency, args.backend, args.timings, args.retry_errors)
+    except ValueError as exc:
+        parser.exit(2, f"{exc}\n")
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare peak Python memory of the legacy and bounded screenshot encoders.
+
+Usage:
+    python benchmarks/bench_encoding.py [--width 10240] [--height 2880] [--runs 3]
+
+Peak memory is measured with tracemalloc, so it covers Python-level buffers
+(BytesIO, bytes, str) but not Pillow's own pixel storage.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_encoding import encode_image_to_data_url  # noqa: E402
+
+
+def _legacy_encode(image) -> str:
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    screenshot_b64 = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/png;base64,{screenshot_b64}"
+
+
+def _bounded_encode(image) -> str:
+    return encode_image_to_data_url(image)
+
+
+def _make_desktop_image(width: int, height: int):
+    # Noise over a gradient compresses roughly like a busy desktop screenshot.
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    return Image.merge("RGB", (gradient, noise, gradient))
+
+
+def _measure(encoder, width: int, height: int) -> tuple[float, float]:
+    image = _make_desktop_image(width, height)
+    tracemalloc.start()
+    started = time.perf_counter()
+    data_url = encoder(image)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data_url
+    return elapsed, peak / (1024 * 1024)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=10240)
+    parser.add_argument("--height", type=int, default=2880)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Encoding {args.width}x{args.height} RGB, {args.runs} run(s) each")
+    for label, encoder in (("legacy", _legacy_encode), ("bounded", _bounded_encode)):
+        results = [_measure(encoder, args.width, args.height) for _ in range(args.runs)]
+        best_time = min(elapsed for elapsed, _ in results)
+        peak = max(peak for _, peak in results)
+        print(f"{label:>8}: {best_time * 1000:8.1f} ms  peak {peak:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
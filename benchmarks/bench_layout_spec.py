@@ -0,0 +1,79 @@
+"""Compare answer latency and tokens with the sample image vs its distilled layout spec.
+
+Usage:
+    python benchmarks/bench_layout_spec.py SCREENSHOT.png [--question "..."] [--runs 3]
+
+Calls OpenAI for real (OPENAI_API_KEY must be set). The layout spec is
+distilled once up front, so its one-off cost is not billed to the spec runs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import mcp_server  # noqa: E402
+from image_encoding import encode_bytes_to_data_url  # noqa: E402
+from model_router import ModelRouter  # noqa: E402
+from reference_assets import SAMPLE_ASSET, reference_assets  # noqa: E402
+from usage_ledger import estimate_image_tokens  # noqa: E402
+
+
+def _run_mode(mode: str, question: str, screenshot_url: str, screenshot_size: tuple[int, int], runs: int) -> None:
+    sample, layout_spec = mcp_server._load_sample_reference(mode)
+    sample_url = sample.data_url if sample is not None else None
+    # Estimated as the server does, so the ledger and router see the same image tokens.
+    image_tokens = estimate_image_tokens(*screenshot_size)
+    if sample is not None:
+        image_tokens += estimate_image_tokens(sample.width, sample.height)
+    router = mcp_server._model_router = ModelRouter()
+
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        mcp_server._call_openai_for_screenshot(question, screenshot_url, sample_url, layout_spec, image_tokens)
+        latencies.append(time.perf_counter() - started)
+
+    tiers = router.stats().values()
+    calls = sum(tier["calls"] for tier in tiers) or 1
+    input_tokens = sum(tier["input_tokens"] for tier in tiers) / calls
+    output_tokens = sum(tier["output_tokens"] for tier in tiers) / calls
+    upload_kib = (len(screenshot_url) + len(sample_url or "") + len(layout_spec or "")) / 1024
+    print(
+        f"{mode:>6}: median {statistics.median(latencies):6.2f} s  "
+        f"input {input_tokens:8.0f} tok  output {output_tokens:6.0f} tok  upload {upload_kib:8.1f} KiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("screenshot", type=Path)
+    parser.add_argument("--question", default="What day is the leg workout in week 1?")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if reference_assets.get(SAMPLE_ASSET) is None:
+        sys.exit(f"Sample image not found: {reference_assets.directory / SAMPLE_ASSET}")
+
+    screenshot_url = encode_bytes_to_data_url(args.screenshot.read_bytes())
+    with Image.open(args.screenshot) as image:
+        screenshot_size = image.size
+    # Distil (or load from cache) before timing anything.
+    _, layout_spec = mcp_server._load_sample_reference("spec")
+    if not layout_spec:
+        sys.exit("Could not distil the layout spec; check OPENAI_API_KEY.")
+
+    print(f"{args.runs} run(s) per mode, question: {args.question!r}")
+    for mode in ("image", "spec"):
+        _run_mode(mode, args.question, screenshot_url, screenshot_size, args.runs)
+
+
+if __name__ == "__main__":
+    main()
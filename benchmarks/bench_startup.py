@@ -0,0 +1,85 @@
+"""Check desktop-app launch time against a budget.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--first-frame-budget 1.0] [--ready-budget 5.0]
+
+Each run spawns ``main.py`` with ``EVERLY_STARTUP_PROBE`` set; the app records
+when the floating bar first painted and when the agent (MCP session included)
+became ready for a question, then quits. Times are measured from the spawn, so
+interpreter start-up counts. Exits with status 1 when a median is over its
+budget. Set ``QT_QPA_PLATFORM=offscreen`` to run without a display.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _launch_once(timeout: float) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        probe = Path(tmp) / "startup.json"
+        env = dict(os.environ, EVERLY_STARTUP_PROBE=str(probe))
+        # check_environment() only needs the key to exist; no request is made.
+        env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+        spawned = time.time()
+        subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / "main.py")],
+            cwd=PROJECT_ROOT,
+            env=env,
+            timeout=timeout,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        marks = json.loads(probe.read_text(encoding="utf-8"))
+    return {
+        "interpreter_s": marks["launch"] - spawned,
+        "first_frame_s": marks["first_frame"] - spawned,
+        "ready_s": marks["ready"] - spawned,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-frame-budget", type=float, default=1.0, help="seconds, median")
+    parser.add_argument("--ready-budget", type=float, default=5.0, help="seconds, median")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per launch")
+    args = parser.parse_args()
+
+    runs = []
+    for index in range(args.runs):
+        result = _launch_once(args.timeout)
+        runs.append(result)
+        print(
+            f"run {index + 1}: interpreter {result['interpreter_s']:5.2f} s  "
+            f"first frame {result['first_frame_s']:5.2f} s  ready {result['ready_s']:5.2f} s"
+        )
+
+    first_frame = statistics.median(run["first_frame_s"] for run in runs)
+    ready = statistics.median(run["ready_s"] for run in runs)
+    print(f"median: first frame {first_frame:.2f} s (budget {args.first_frame_budget:.2f} s), "
+          f"ready {ready:.2f} s (budget {args.ready_budget:.2f} s)")
+
+    over = []
+    if first_frame > args.first_frame_budget:
+        over.append("first frame")
+    if ready > args.ready_budget:
+        over.append("ready")
+    if over:
+        sys.exit(f"Startup regression: {' and '.join(over)} over budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Measure MCP tool throughput over a single connection, sequential vs concurrent.
+
+Usage:
+    python benchmarks/bench_tool_concurrency.py [--webhooks 8] [--latency 0.3]
+
+Upstream calls are replaced by local stand-ins: webhooks and OpenAI sleep for
+``--latency`` seconds, and screen capture encodes a synthetic desktop image so
+the CPU-bound part still runs in the process pool.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import anyio
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Stand-in usage goes to a throwaway ledger, not .everly_cache/usage.sqlite3.
+_SCRATCH = tempfile.TemporaryDirectory(prefix="everly-bench-")
+os.environ["EVERLY_USAGE_DB"] = str(Path(_SCRATCH.name) / "usage.sqlite3")
+
+from mcp.shared.memory import create_connected_server_and_client_session  # noqa: E402
+
+import mcp_server  # noqa: E402
+from image_encoding import EncodedFrame, encode_frame  # noqa: E402
+
+
+def _synthetic_capture(mode, region, max_side, width=1920, height=1080) -> EncodedFrame:
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    return encode_frame(Image.merge("RGB", (gradient, noise, gradient)))
+
+
+def _install_stand_ins(latency: float) -> None:
+    def fake_post(*args, **kwargs):
+        time.sleep(latency)
+        return SimpleNamespace(status_code=200)
+
+    def fake_openai(question, screenshot_url, sample_url, layout_spec=None, image_tokens=0):
+        time.sleep(latency)
+        return f"answer to {question}"
+
+    mcp_server.requests.post = fake_post
+    mcp_server._ask_openai_for_screenshot = fake_openai
+    # Keep the stand-in answers out of the searchable history.
+    mcp_server.HISTORY_ENABLED = False
+    # The calendar extraction would call the real OpenAI API.
+    mcp_server.LOCAL_CALENDAR_ANSWERS = False
+    mcp_server._load_sample_reference = lambda: (None, None)
+    mcp_server.capture_encoded_frame = _synthetic_capture
+
+
+def _calls(webhooks: int) -> list[tuple[str, dict]]:
+    calls = [("screenshot_analysis", {"question": "What day is the leg workout?"})]
+    calls += [("send_message_to_client", {"message": f"Check-in #{index}"}) for index in range(webhooks)]
+    return calls
+
+
+async def _run(webhooks: int) -> None:
+    calls = _calls(webhooks)
+    async with create_connected_server_and_client_session(mcp_server.server._mcp_server) as session:
+        # Warm the process pool so worker start-up is not billed to either mode.
+        await session.call_tool(*calls[0])
+
+        started = time.perf_counter()
+        for name, arguments in calls:
+            await session.call_tool(name, arguments)
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        async with anyio.create_task_group() as group:
+            for name, arguments in calls:
+                group.start_soon(session.call_tool, name, arguments)
+        concurrent = time.perf_counter() - started
+
+    print(f"{len(calls)} calls (1 screenshot_analysis + {webhooks} webhooks) over one connection")
+    print(f"  sequential: {sequential:6.2f} s  ({len(calls) / sequential:5.2f} calls/s)")
+    print(f"  concurrent: {concurrent:6.2f} s  ({len(calls) / concurrent:5.2f} calls/s)")
+    print(f"  speed-up:   {sequential / concurrent:6.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--webhooks", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in upstream latency in seconds")
+    args = parser.parse_args()
+
+    _install_stand_ins(args.latency)
+    anyio.run(_run, args.webhooks)
+
+
+if __name__ == "__main__":
+    main()
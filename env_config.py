@@ -0,0 +1,36 @@
+"""Typed helpers for reading optional ``EVERLY_*`` settings from the environment."""
+
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+
+_TRUTHY = ("1", "true", "yes", "on")
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in _TRUTHY
+
+
+def env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
@@ -0,0 +1,212 @@
+"""Hand raw screenshot frames from the UI process to the MCP server without base64.
+
+The producer writes the frame's raw pixels into a ``multiprocessing.shared_memory``
+segment (or a memory-mapped temp file) and sends only a small handle through
+JSON-RPC. The server attaches to the segment, encodes straight from it, and
+detaches; the producer owns the segment and unlinks it once the call returns.
+"""
+
+from __future__ import annotations
+
+import atexit
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from PIL import Image
+
+from image_encoding import EncodedFrame, encode_frame
+from screen_capture import downscale
+
+
+FRAME_TRANSPORTS = ("shm", "mmap")
+DEFAULT_FRAME_TRANSPORT = os.getenv("EVERLY_FRAME_TRANSPORT", "shm")
+
+_SUPPORTED_MODES = {"L": 1, "RGB": 3, "RGBA": 4}
+_MMAP_PREFIX = "everly-frame-"
+# Rows copied per band, so publishing never holds a second full copy of the frame.
+_BAND_ROWS = 256
+
+FrameHandle = dict[str, Any]
+
+
+def _write_bands(image, target: memoryview) -> None:
+    row_bytes = image.width * _SUPPORTED_MODES[image.mode]
+    for top in range(0, image.height, _BAND_ROWS):
+        bottom = min(image.height, top + _BAND_ROWS)
+        band = image.crop((0, top, image.width, bottom))
+        target[top * row_bytes : bottom * row_bytes] = band.tobytes()
+        band.close()
+
+
+class PublishedFrame:
+    """A frame written to shared memory or a mapped file, owned by the producer."""
+
+    def __init__(self, handle: FrameHandle, shm: Optional[shared_memory.SharedMemory] = None) -> None:
+        self.handle = handle
+        self._shm = shm
+        self._closed = False
+
+    def close(self) -> None:
+        """Release and unlink the backing segment; safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        with _outstanding_lock:
+            _outstanding.discard(self)
+        if self._shm is not None:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+        else:
+            try:
+                os.unlink(self.handle["path"])
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "PublishedFrame":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+_outstanding: set[PublishedFrame] = set()
+_outstanding_lock = threading.Lock()
+
+
+@atexit.register
+def _cleanup_outstanding() -> None:
+    with _outstanding_lock:
+        frames = list(_outstanding)
+    for frame in frames:
+        frame.close()
+
+
+def publish_frame(image, transport: str = DEFAULT_FRAME_TRANSPORT) -> PublishedFrame:
+    """Copy ``image`` into a shared segment and return its owner object."""
+    if transport not in FRAME_TRANSPORTS:
+        raise ValueError(f"Unknown frame transport '{transport}'. Expected one of: {', '.join(FRAME_TRANSPORTS)}.")
+    if image.mode not in _SUPPORTED_MODES:
+        image = image.convert("RGB")
+
+    size = image.width * image.height * _SUPPORTED_MODES[image.mode]
+    handle: FrameHandle = {
+        "transport": transport,
+        "width": image.width,
+        "height": image.height,
+        "mode": image.mode,
+    }
+
+    if transport == "shm":
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            _write_bands(image, shm.buf)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        handle["name"] = shm.name
+        frame = PublishedFrame(handle, shm)
+    else:
+        fd, path = tempfile.mkstemp(prefix=_MMAP_PREFIX, suffix=".raw")
+        try:
+            os.ftruncate(fd, size)
+            with mmap.mmap(fd, size) as mapped:
+                _write_bands(image, memoryview(mapped))
+        except BaseException:
+            os.close(fd)
+            os.unlink(path)
+            raise
+        os.close(fd)
+        handle["path"] = path
+        frame = PublishedFrame(handle)
+
+    with _outstanding_lock:
+        _outstanding.add(frame)
+    return frame
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    with _outstanding_lock:
+        owned = any(frame.handle.get("name") == name for frame in _outstanding)
+    if owned:
+        # Our own segment: the producer's unlink() keeps the tracker consistent.
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the segment with this
+        # process's resource tracker, which would unlink it when we exit.
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:  # pragma: no cover - tracker not running (e.g. Windows)
+            pass
+        return shm
+
+
+def validate_frame_handle(handle: FrameHandle) -> FrameHandle:
+    """Check a handle received over JSON-RPC before touching shared memory."""
+    transport = handle.get("transport")
+    if transport not in FRAME_TRANSPORTS:
+        raise ValueError(f"Unknown frame transport '{transport}'.")
+    if handle.get("mode") not in _SUPPORTED_MODES:
+        raise ValueError(f"Unsupported frame mode '{handle.get('mode')}'.")
+    if int(handle.get("width", 0)) <= 0 or int(handle.get("height", 0)) <= 0:
+        raise ValueError("Frame handle is missing its dimensions.")
+    if transport == "shm" and not handle.get("name"):
+        raise ValueError("Shared-memory frame handle is missing its segment name.")
+    if transport == "mmap":
+        path = Path(handle.get("path") or "")
+        # Only map files this module created, never arbitrary paths.
+        if path.parent != Path(tempfile.gettempdir()) or not path.name.startswith(_MMAP_PREFIX):
+            raise ValueError("Memory-mapped frame handle points outside the frame directory.")
+    return handle
+
+
+@contextmanager
+def open_frame(handle: FrameHandle) -> Iterator[Image.Image]:
+    """Attach to a published frame and yield it as a PIL image (consumer side)."""
+    validate_frame_handle(handle)
+    size = (int(handle["width"]), int(handle["height"]))
+    mode = handle["mode"]
+    expected = size[0] * size[1] * _SUPPORTED_MODES[mode]
+
+    if handle["transport"] == "shm":
+        shm = _attach_shared_memory(handle["name"])
+        buffer, release = shm.buf, shm.close
+    else:
+        with open(handle["path"], "rb") as source:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mapped)
+
+        def release() -> None:
+            buffer.release()
+            mapped.close()
+
+    try:
+        if len(buffer) < expected:
+            raise ValueError("Frame segment is smaller than its declared dimensions.")
+        image = Image.frombuffer(mode, size, buffer[:expected], "raw", mode, 0, 1)
+        try:
+            yield image
+        finally:
+            image.close()
+            del image
+    finally:
+        release()
+
+
+def encode_published_frame(handle: FrameHandle, max_side: Optional[int] = None) -> EncodedFrame:
+    """Hash and encode a published frame as a PNG data URL, straight from its shared buffer."""
+    with open_frame(handle) as image:
+        image = downscale(image, max_side)
+        return encode_frame(image)
@@ -0,0 +1,134 @@
+"""Question/answer history in SQLite with an FTS5 full-text index.
+
+The MCP server appends every answered screen question together with the
+screen's perceptual hash; the UI pages through and searches the same
+database to reuse past answers instead of paying for a new vision call.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from env_config import env_flag
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+HISTORY_PATH = Path(os.getenv("EVERLY_HISTORY_DB", PROJECT_ROOT / ".everly_cache" / "history.sqlite3"))
+HISTORY_ENABLED = env_flag("EVERLY_HISTORY", True)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    tool TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    screen_hash TEXT,
+    capture_mode TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    question, answer, content='history', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, question, answer)
+    VALUES ('delete', old.id, old.question, old.answer);
+END;
+"""
+
+_COLUMNS = "h.id, h.ts, h.tool, h.question, h.answer, h.screen_hash, h.capture_mode"
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HistoryEntry(NamedTuple):
+    id: int
+    ts: float
+    tool: str
+    question: str
+    answer: str
+    screen_hash: Optional[str]
+    capture_mode: Optional[str]
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    tokens = _TOKEN_PATTERN.findall(text)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class HistoryStore:
+    """Thread-safe access to the history database; one connection per store."""
+
+    def __init__(self, path: Path = HISTORY_PATH) -> None:
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            # WAL: the server writes while the UI reads.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(
+        self,
+        question: str,
+        answer: str,
+        tool: str = "screenshot_analysis",
+        screen_hash: Optional[str] = None,
+        capture_mode: Optional[str] = None,
+    ) -> int:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO history (ts, tool, question, answer, screen_hash, capture_mode) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (time.time(), tool, question, answer, screen_hash, capture_mode),
+                )
+            return cursor.lastrowid
+
+    def page(self, search: str = "", before_id: Optional[int] = None, limit: int = 200) -> list[HistoryEntry]:
+        """Newest entries first, older than ``before_id``; keyset paging stays fast deep into the list."""
+        query = fts_query(search)
+        before_id = before_id if before_id is not None else 1 << 62
+        with self._lock:
+            connection = self._connect()
+            if query is None:
+                rows = connection.execute(
+                    f"SELECT {_COLUMNS} FROM history h WHERE h.id < ? ORDER BY h.id DESC LIMIT ?",
+                    (before_id, limit),
+                )
+            else:
+                # Ordering and limiting on the FTS rowid lets FTS5 stop after one page.
+                rows = connection.execute(
+                    f"SELECT {_COLUMNS} FROM ("
+                    "SELECT rowid FROM history_fts WHERE history_fts MATCH ? AND rowid < ? "
+                    "ORDER BY rowid DESC LIMIT ?"
+                    ") AS matches JOIN history h ON h.id = matches.rowid ORDER BY h.id DESC",
+                    (query, before_id, limit),
+                )
+            return [HistoryEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+history = HistoryStore()
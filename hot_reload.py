@@ -0,0 +1,87 @@
+"""In-process hot reload of ``ui.py`` for development (``python main.py --hot-reload``).
+
+When ``ui.py`` is saved the module is reloaded with ``importlib.reload`` and
+``FloatingWindow`` is rebuilt in place, keeping its position, input text and
+any visible result. Nothing outside ``ui`` is reloaded, so the Qt application,
+the MCP agent and its connections and caches stay warm. A file that does not
+compile is reported and the current window is kept; if the new module cannot
+build a window the app exits with ``RESTART_EXIT_CODE`` and ``main.py``
+restarts the process.
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import time
+import traceback
+from pathlib import Path
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer
+from PySide6.QtWidgets import QApplication, QMainWindow
+
+
+RESTART_EXIT_CODE = 75
+
+_DEBOUNCE_MS = 300
+_BUSY_RETRY_MS = 500
+
+
+class UiHotReloader(QObject):
+    """Watch a UI module and swap in a rebuilt ``FloatingWindow`` when it changes."""
+
+    def __init__(self, window: QMainWindow, module_name: str = "ui") -> None:
+        super().__init__()
+        self.window = window
+        self.module_name = module_name
+        self.path = Path(sys.modules[module_name].__file__).resolve()
+
+        self.watcher = QFileSystemWatcher([str(self.path)], self)
+        self.watcher.fileChanged.connect(self._schedule)
+        # Editors write in bursts; reload once the file has been quiet for a moment.
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.reload)
+
+    def _watch(self) -> None:
+        # Atomic saves replace the file, which silently drops it from the watch list.
+        if str(self.path) not in self.watcher.files() and self.path.exists():
+            self.watcher.addPath(str(self.path))
+
+    def _schedule(self, _path: str = "") -> None:
+        self._watch()
+        self.timer.start(_DEBOUNCE_MS)
+
+    def reload(self) -> None:
+        self._watch()
+        threads = [getattr(self.window, name, None) for name in ("analysis_thread", "agent_loader")]
+        if any(thread is not None and thread.isRunning() for thread in threads):
+            # Let an in-flight question (or the agent load) finish on the window that started it.
+            self.timer.start(_BUSY_RETRY_MS)
+            return
+
+        try:
+            compile(self.path.read_text(encoding="utf-8"), str(self.path), "exec")
+        except (OSError, SyntaxError, ValueError) as exc:
+            print(f"⚠️  {self.path.name} not reloaded, keeping the current window: {exc}")
+            return
+
+        started = time.perf_counter()
+        try:
+            module = importlib.reload(sys.modules[self.module_name])
+            state = self.window.export_state()
+            new_window = module.FloatingWindow(agent=self.window.agent)
+            new_window.show()
+            new_window.restore_state(state)
+        except Exception:
+            traceback.print_exc()
+            print("🔄 Hot reload failed, restarting the application...")
+            QApplication.exit(RESTART_EXIT_CODE)
+            return
+
+        old_window, self.window = self.window, new_window
+        # hide() rather than close(): closing the last window would quit the app.
+        old_window.hide()
+        old_window.deleteLater()
+        new_window.input_field.setFocus()
+        print(f"♻️  Reloaded {self.path.name} in {(time.perf_counter() - started) * 1000:.0f} ms")
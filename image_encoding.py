@@ -0,0 +1,110 @@
+"""Bounded-memory image encoding for vision requests.
+
+The naive path keeps the PIL image, the ``BytesIO`` buffer, its ``getvalue()``
+copy, the base64 bytes and the decoded str alive at the same time. Here the
+encoded image is read through a memoryview, base64 is written chunk by chunk
+into one preallocated buffer that already holds the ``data:`` URL prefix, and
+every intermediate is released as soon as the next stage no longer needs it.
+"""
+
+from __future__ import annotations
+
+import binascii
+import hashlib
+from io import BytesIO
+from typing import NamedTuple
+
+
+# Multiple of 3 so each chunk encodes to base64 without padding.
+_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def _base64_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def _encode_base64_into(data, prefix: bytes) -> bytearray:
+    with memoryview(data) as view, view.cast("B") as flat:
+        total = len(flat)
+        out = bytearray(len(prefix) + _base64_length(total))
+        out[: len(prefix)] = prefix
+        position = len(prefix)
+        for start in range(0, total, _CHUNK_SIZE):
+            encoded = binascii.b2a_base64(flat[start : start + _CHUNK_SIZE], newline=False)
+            out[position : position + len(encoded)] = encoded
+            position += len(encoded)
+    return out
+
+
+def encode_bytes_to_data_url(data, mime_type: str = "image/png") -> str:
+    """Base64-encode ``data`` (any buffer) into a ``data:`` URL without full copies."""
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    return _encode_base64_into(data, prefix).decode("ascii")
+
+
+def encode_image_to_data_url(image, format: str = "PNG", close: bool = True) -> str:
+    """Encode a PIL image as a ``data:`` URL, releasing the raw image once encoded.
+
+    With ``close`` the image's pixel storage is freed right after the PNG/JPEG
+    bytes are written, so callers must not use ``image`` afterwards.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format=format)
+    if close:
+        image.close()
+
+    prefix = f"data:image/{format.lower()};base64,".encode("ascii")
+    with buffer.getbuffer() as view:
+        encoded = _encode_base64_into(view, prefix)
+    # Drop the PNG bytes before materialising the final str.
+    buffer.close()
+    return encoded.decode("ascii")
+
+
+def data_url_to_base64(data_url: str) -> str:
+    """Strip the ``data:...;base64,`` prefix from a data URL."""
+    return data_url.partition(",")[2]
+
+
+class EncodedFrame(NamedTuple):
+    """A screenshot ready for upload, plus hashes identifying what was on screen.
+
+    ``frame_hash`` is perceptual and only suited to grouping similar screens;
+    ``content_hash`` is the SHA-256 of the encoded image and is what caches
+    and deduplication key on.
+    """
+
+    data_url: str
+    frame_hash: str
+    content_hash: str
+    width: int
+    height: int
+
+
+# Thumbnail used for frame hashing: small and coarsely quantised, so cursor
+# blinks and anti-aliasing noise do not change the hash of an unchanged screen.
+_HASH_SIZE = (64, 40)
+_HASH_LEVELS = 16
+
+
+def frame_hash(image) -> str:
+    """Perceptual hash of ``image``: equal for visually identical screens."""
+    thumbnail = image.convert("L").resize(_HASH_SIZE)
+    step = 256 // _HASH_LEVELS
+    quantised = bytes(value // step for value in thumbnail.tobytes())
+    thumbnail.close()
+    return hashlib.sha1(quantised + f"{image.width}x{image.height}".encode()).hexdigest()
+
+
+def encode_frame(image, format: str = "PNG") -> EncodedFrame:
+    """Hash and encode ``image`` as an :class:`EncodedFrame`, releasing the raw image."""
+    perceptual = frame_hash(image)
+    width, height = image.size
+    buffer = BytesIO()
+    image.save(buffer, format=format)
+    image.close()
+    with buffer.getbuffer() as view:
+        digest = hashlib.sha256(view).hexdigest()
+        data_url = encode_bytes_to_data_url(view, f"image/{format.lower()}")
+    buffer.close()
+    return EncodedFrame(data_url, perceptual, digest, width, height)
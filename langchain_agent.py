@@ -1,22 +1,61 @@
 import os
-import base64
+import time
 import requests
-from io import BytesIO
-from typing import Any, Type
+from typing import Any, Optional, Type
 from datetime import datetime, timedelta
-import pyautogui
 from PIL import Image
 from langchain.agents import initialize_agent, AgentType
 from langchain_openai import ChatOpenAI
 from langchain.tools import BaseTool
 from langchain.schema import HumanMessage
+from langchain.callbacks.base import BaseCallbackHandler
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import dateparser
 
+from image_encoding import encode_image_to_data_url
+from layout_spec import SAMPLE_MODE, get_layout_spec
+from model_router import AGENT_TIER, ModelRouter, ModelTier, TierResult, model_cost
+from reference_assets import SAMPLE_ASSET, reference_assets
+from resilience import CircuitOpenError, get_upstream_guard, upstream_stats
+from screen_capture import DEFAULT_CAPTURE_MODE, capture_screen
+from usage_ledger import estimate_image_tokens, ledger
+
 # Load environment variables
 load_dotenv()
 
+# Model table shared by the screenshot tool and the agent
+model_router = ModelRouter()
+
+
+class UsageLedgerCallback(BaseCallbackHandler):
+    """Append every LLM call made by the agent to the usage ledger."""
+
+    def __init__(self, tool: str, model: str):
+        self.tool = tool
+        self.model = model
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        latency = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+        ledger.record(
+            self.tool, self.model, latency, input_tokens, output_tokens,
+            cost_usd=model_cost(self.model, input_tokens, output_tokens),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        latency = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        ledger.record(self.tool, self.model, latency, status="error")
+
 
 # ===== Tool 1: Screenshot Analysis =====
 class ScreenshotTool(BaseTool):
@@ -24,45 +63,66 @@ class ScreenshotTool(BaseTool):
     description: str = (
         "ONLY use this tool when the user is asking about what's visible on their screen, UI elements, window content, or screen analysis. Do NOT use for general greetings, conversations, or questions unrelated to the screen. Takes a screenshot and analyzes it with the user's question using GPT-4o Vision."
     )
+    capture_mode: str = DEFAULT_CAPTURE_MODE
+    region: Optional[tuple[int, int, int, int]] = None
+    # Analyze a saved screenshot instead of capturing the screen (headless runs)
+    image_path: Optional[str] = None
 
     def _run(self, query: str) -> str:
         """Take a screenshot and analyze it with the user's question."""
         try:
-            # Take screenshot
-            screenshot = pyautogui.screenshot()
-
-            # Convert to base64 for OpenAI API
-            buffered = BytesIO()
-            screenshot.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-
-            # Load Sample Image
-            with open("./train_static/coach_tabTraning.png", "rb") as f:
-                sample_img_str = base64.b64encode(f.read()).decode()
-
-
-            # Create OpenAI client
-            llm = ChatOpenAI(
-                model="gpt-4o", temperature=0, api_key=os.getenv("OPENAI_API_KEY")
+            # Take screenshot (full screen, monitor, active window or region)
+            if self.image_path:
+                screenshot = Image.open(self.image_path)
+            else:
+                screenshot = capture_screen(self.capture_mode, self.region)
+
+            image_tokens = estimate_image_tokens(*screenshot.size)
+
+            # Convert to a base64 data URL for OpenAI API (releases the raw screenshot)
+            img_url = encode_image_to_data_url(screenshot)
+            del screenshot
+
+            # Sample Image from the shared asset registry, or its distilled layout spec when available
+            sample = reference_assets.get(SAMPLE_ASSET)
+            layout_spec = (
+                get_layout_spec(sample.data, digest=sample.content_hash)
+                if sample is not None and SAMPLE_MODE == "spec"
+                else None
             )
 
-            # Create message with image and text
-            message = HumanMessage(
-                content=[
+            sample_intro = (
+                "This is a SAMPLE IMAGE of the Everfit platform's 'Training' tab (Assignment view).\n"
+                "- The calendar is in '2-Week view' with 2 horizontal rows representing week 1 and week 2.\n"
+                "- Each row has 7 columns for Monday through Sunday.\n"
+                "- Each white box inside a day cell is a workout card showing exercise details like sets, reps, and intensity.\n"
+                "Use this sample to understand the layout structure."
+            )
+            if layout_spec:
+                sample_blocks = [
                     {
                         "type": "text",
-                        "text": (
-                            "This is a SAMPLE IMAGE of the Everfit platform's 'Training' tab (Assignment view).\n"
-                            "- The calendar is in '2-Week view' with 2 horizontal rows representing week 1 and week 2.\n"
-                            "- Each row has 7 columns for Monday through Sunday.\n"
-                            "- Each white box inside a day cell is a workout card showing exercise details like sets, reps, and intensity.\n"
-                            "Use this sample to understand the layout structure."
-                        ),
+                        "text": sample_intro.replace("This is a SAMPLE IMAGE", "This describes the layout")
+                        + f"\nDetailed layout spec distilled from the sample image:\n{layout_spec}",
                     },
+                ]
+            elif sample is None:
+                # Without the sample the model reads the screenshot on its own
+                sample_blocks = []
+            else:
+                image_tokens += estimate_image_tokens(sample.width, sample.height)
+                sample_blocks = [
+                    {"type": "text", "text": sample_intro},
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{sample_img_str}"},
+                        "image_url": {"url": sample.data_url()},
                     },
+                ]
+
+            # Create message with image and text
+            message = HumanMessage(
+                content=sample_blocks
+                + [
                     {
                         "type": "text",
                         "text": (
@@ -72,15 +132,28 @@ class ScreenshotTool(BaseTool):
                     },
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{img_str}"},
+                        "image_url": {"url": img_url},
                     },
                 ]
             )
 
-            # Get response
-            response = llm.invoke([message])
-            return response.content
-
+            def request(tier: ModelTier) -> TierResult:
+                # Create OpenAI client for the routed tier
+                llm = ChatOpenAI(
+                    model=tier.model, temperature=tier.temperature, api_key=os.getenv("OPENAI_API_KEY")
+                )
+                # Get response (hedged and guarded by the OpenAI circuit breaker)
+                response = get_upstream_guard("OpenAI").call(llm.invoke, [message])
+                usage = getattr(response, "usage_metadata", None) or {}
+                return TierResult(
+                    response.content, usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+                )
+
+            # Simple lookups go to the fast tier and escalate if the answer is unsure
+            return model_router.run(query, request, tool=self.name, image_tokens=image_tokens)
+
+        except CircuitOpenError as e:
+            return str(e)
         except Exception as e:
             return f"Error analyzing screenshot: {str(e)}"
 
@@ -114,9 +187,15 @@ class ScheduleWorkoutTool(BaseTool):
             return "Không hiểu ngày bạn cung cấp."
 
         payload = {"name": "Workout with Everfit", "Date": parsed}
+        started = time.perf_counter()
         response = requests.post(
             "https://hook.eu2.make.com/9ty1og2anuaz4f8xdpvde7pxtkc12sxq", json=payload
         )
+        ledger.record(
+            self.name,
+            latency_s=time.perf_counter() - started,
+            status="ok" if response.status_code == 200 else f"http_{response.status_code}",
+        )
         return (
             f"✅ Đã đặt lịch tập vào {parsed}"
             if response.status_code == 200
@@ -142,7 +221,13 @@ class SendMessageToClientTool(BaseTool):
     def _run(self, message: str) -> str:
         url = "https://hook.us2.make.com/m8j6cxm9st36azfve84ve1x7fbgmxbtt"
         payload = {"message": message}
+        started = time.perf_counter()
         response = requests.post(url, json=payload)
+        ledger.record(
+            self.name,
+            latency_s=time.perf_counter() - started,
+            status="ok" if response.status_code == 200 else f"http_{response.status_code}",
+        )
         return (
             f"✅ Đã gửi tin nhắn: {message}"
             if response.status_code == 200
@@ -156,8 +241,12 @@ class SendMessageToClientTool(BaseTool):
 class FloatingAppAgent:
     def __init__(self):
         """Initialize the LangChain agent with all tools."""
+        agent_tier = model_router.tier(AGENT_TIER)
         self.llm = ChatOpenAI(
-            model="gpt-4o", temperature=0.5, api_key=os.getenv("OPENAI_API_KEY")
+            model=agent_tier.model,
+            temperature=agent_tier.temperature,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            callbacks=[UsageLedgerCallback("langchain_agent", agent_tier.model)],
         )
 
         self.tools = [
@@ -174,8 +263,25 @@ class FloatingAppAgent:
             handle_parsing_errors=True,
         )
 
-    def analyze_screenshot_with_question(self, question: str) -> str:
-        """Analyze screenshot with user's question using the agent."""
+    def upstream_stats(self) -> dict:
+        """Hedge, circuit breaker and model tier statistics for the screenshot tool."""
+        return {"upstream": upstream_stats(), "model_tiers": model_router.stats()}
+
+    def analyze_screenshot_with_question(
+        self,
+        question: str,
+        capture_mode: str = DEFAULT_CAPTURE_MODE,
+        region: Optional[tuple[int, int, int, int]] = None,
+        image_path: Optional[str] = None,
+    ) -> str:
+        """Analyze screenshot with user's question using the agent.
+
+        ``image_path`` points the screenshot tool at a saved image instead of the screen.
+        """
+        screenshot_tool = self.tools[0]
+        screenshot_tool.capture_mode = capture_mode
+        screenshot_tool.region = region
+        screenshot_tool.image_path = image_path
         try:
             response = self.agent.invoke(
                 {
@@ -0,0 +1,186 @@
+"""Distilled text description of the Everfit sample layout, used instead of the image.
+
+The sample screenshot in ``train_static/`` only gives the model structural
+guidance, yet attaching it doubles the image tokens of every request. It is
+distilled once into a compact layout spec, cached on disk under the image's
+content hash, and the spec text is sent in its place. Set
+``EVERLY_SAMPLE_MODE=image`` to send the image as before.
+
+A failed distillation is not retried for ``EVERLY_LAYOUT_RETRY_AFTER`` seconds,
+doubling after each further failure up to an hour; meanwhile the image is sent.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+from openai import OpenAI
+from PIL import Image
+
+import tracing
+from env_config import env_float
+from image_encoding import encode_bytes_to_data_url
+from model_router import model_cost
+from resilience import get_upstream_guard
+from usage_ledger import estimate_image_tokens, ledger
+
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+LAYOUT_CACHE_DIR = Path(os.getenv("EVERLY_LAYOUT_CACHE_DIR", PROJECT_ROOT / ".everly_cache" / "layout_specs"))
+
+SAMPLE_MODES = ("spec", "image")
+SAMPLE_MODE = os.getenv("EVERLY_SAMPLE_MODE", "spec")
+DISTILL_MODEL = os.getenv("EVERLY_LAYOUT_DISTILL_MODEL", "gpt-4o")
+RETRY_AFTER = env_float("EVERLY_LAYOUT_RETRY_AFTER", 60.0)
+_MAX_RETRY_AFTER = 3600.0
+
+_DISTILL_PROMPT = (
+    "This is a sample screenshot of the Everfit coaching platform's 'Training' tab (Assignment view). "
+    "Write a compact layout specification another model can use, instead of this image, to read real "
+    "screenshots of the same screen. Cover: the overall page regions and where they sit; the calendar "
+    "structure (view mode, rows, columns, how weeks and days are labelled); what a day cell contains; the "
+    "fields shown on a workout card (title, exercises, sets, reps, intensity) and how they are laid out; "
+    "and visual cues for empty days, rest days and completed workouts. Use terse bullet points, no prose, "
+    "under 250 words. Describe structure only, not the specific workouts in this sample."
+)
+
+_memo: dict[str, str] = {}
+# digest -> (consecutive failures, monotonic time before which no retry is made)
+_failures: dict[str, tuple[int, float]] = {}
+_distilling: dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_path(digest: str) -> Path:
+    return LAYOUT_CACHE_DIR / f"{digest}.txt"
+
+
+def _distill(image_bytes: bytes) -> Optional[str]:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    with Image.open(BytesIO(image_bytes)) as image:
+        image_tokens = estimate_image_tokens(*image.size)
+
+    client = OpenAI(api_key=api_key)
+    started = time.perf_counter()
+    with tracing.span("openai.layout_distill", cat="upstream", model=DISTILL_MODEL):
+        response = get_upstream_guard("OpenAI").call(
+            client.responses.create,
+            model=DISTILL_MODEL,
+            temperature=0,
+            input=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": _DISTILL_PROMPT},
+                        {"type": "input_image", "image_url": encode_bytes_to_data_url(image_bytes)},
+                    ],
+                }
+            ],
+            max_output_tokens=500,
+        )
+    usage = getattr(response, "usage", None)
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    ledger.record(
+        "layout_distill",
+        DISTILL_MODEL,
+        time.perf_counter() - started,
+        input_tokens,
+        output_tokens,
+        image_tokens,
+        model_cost(DISTILL_MODEL, input_tokens, output_tokens),
+    )
+    return (getattr(response, "output_text", None) or "").strip() or None
+
+
+def _record_failure(digest: str) -> None:
+    with _lock:
+        count = _failures.get(digest, (0, 0.0))[0] + 1
+        delay = min(RETRY_AFTER * 2 ** (count - 1), _MAX_RETRY_AFTER)
+        _failures[digest] = (count, time.monotonic() + delay)
+
+
+def _lookup(digest: str) -> Optional[str]:
+    with _lock:
+        if digest in _memo:
+            return _memo[digest]
+    path = _cache_path(digest)
+    if not path.exists():
+        return None
+    spec = path.read_text(encoding="utf-8").strip()
+    with _lock:
+        _memo[digest] = spec
+    return spec
+
+
+def get_layout_spec(image_bytes: bytes, distill: bool = True, digest: Optional[str] = None) -> Optional[str]:
+    """Return the cached spec for ``image_bytes``, distilling it on first use.
+
+    Returns ``None`` when no spec is available, in which case callers should
+    fall back to attaching the image itself. Only one distillation per image
+    runs at a time, and other images are not held up by it. Pass ``digest``
+    (the SHA-256 of ``image_bytes``) when it is already known to skip hashing.
+    """
+    digest = digest or content_hash(image_bytes)
+    spec = _lookup(digest)
+    if spec is not None or not distill:
+        return spec
+
+    with _lock:
+        failure = _failures.get(digest)
+        if failure is not None and time.monotonic() < failure[1]:
+            return None
+        distill_lock = _distilling.setdefault(digest, threading.Lock())
+    with distill_lock:
+        try:
+            return _distill_once(digest, image_bytes)
+        finally:
+            with _lock:
+                _distilling.pop(digest, None)
+
+
+def _distill_once(digest: str, image_bytes: bytes) -> Optional[str]:
+    """Distil and store the spec; call with the digest's distillation lock held."""
+    spec = _lookup(digest)
+    if spec is not None:
+        return spec
+    with _lock:
+        failure = _failures.get(digest)
+        if failure is not None and time.monotonic() < failure[1]:
+            # Another caller failed while this one waited.
+            return None
+    try:
+        spec = _distill(image_bytes)
+    except Exception as exc:  # pragma: no cover - network error handling
+        logger.warning("Layout distillation failed, sending the sample image instead: %s", exc)
+        spec = None
+    if not spec:
+        _record_failure(digest)
+        return None
+
+    path = _cache_path(digest)
+    LAYOUT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(spec, encoding="utf-8")
+    os.replace(temporary, path)
+    logger.info("Distilled layout spec %s (%d chars)", digest[:12], len(spec))
+    with _lock:
+        _failures.pop(digest, None)
+        _memo[digest] = spec
+    return spec
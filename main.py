@@ -1,6 +1,12 @@
+import time
+LAUNCH_TIME = time.time()
+
+import argparse
+import json
 import sys
 import os
 from PySide6.QtWidgets import QApplication
+import tracing
 from ui import FloatingWindow
 
 def check_environment():
@@ -12,26 +18,70 @@ def check_environment():
         return False
     return True
 
+def install_startup_probe(app, window, path):
+    """Write launch, first-frame and ready timestamps to ``path``, then quit.
+
+    Used by benchmarks/bench_startup.py (``EVERLY_STARTUP_PROBE=<file>``).
+    """
+    marks = {"launch": LAUNCH_TIME}
+    
+    def on_first_frame():
+        marks.setdefault("first_frame", time.time())
+    
+    def on_ready():
+        marks["ready"] = time.time()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(marks, f)
+        app.quit()
+    
+    window.first_frame.connect(on_first_frame)
+    window.agent_ready.connect(on_ready)
+
+def parse_args():
+    """Split our own flags from the arguments passed on to Qt."""
+    parser = argparse.ArgumentParser(description="Everly floating assistant")
+    parser.add_argument(
+        "--hot-reload",
+        action="store_true",
+        help="reload ui.py in place when it changes (development)",
+    )
+    return parser.parse_known_args()
+
 def main():
     """Main application entry point."""
+    args, qt_args = parse_args()
+    
     # Check environment
     if not check_environment():
         sys.exit(1)
     
     # Create Qt application
-    app = QApplication(sys.argv)
+    tracing.set_process_name("Everly UI")
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setApplicationName("Floating AI Assistant")
     app.setApplicationVersion("1.0.0")
     
-    # Create and show the floating window
+    # Show the floating bar first; the agent loads in the background after it paints
     window = FloatingWindow()
+    probe_path = os.getenv("EVERLY_STARTUP_PROBE")
+    if probe_path:
+        install_startup_probe(app, window, probe_path)
     window.show()
     
     # Set focus to input field
     window.input_field.setFocus()
     
+    # Rebuild the window in place when ui.py changes
+    reloader = None
+    if args.hot_reload:
+        from hot_reload import RESTART_EXIT_CODE, UiHotReloader
+        reloader = UiHotReloader(window)
+    
     # Run the application
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if reloader is not None and exit_code == RESTART_EXIT_CODE:
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
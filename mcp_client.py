@@ -2,19 +2,44 @@
 
 from __future__ import annotations
 
+import atexit
+import functools
+import os
 import sys
+import threading
+from concurrent.futures import Future
+from contextlib import AbstractContextManager
 from dataclasses import dataclass
+from datetime import timedelta
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Optional, Sequence
 
 import anyio
-from mcp.client.session_group import ClientSessionGroup
+import httpx
+from anyio.abc import TaskStatus
+from anyio.from_thread import BlockingPortal, start_blocking_portal
+from mcp.client.session_group import ClientSessionGroup, StreamableHttpParameters
 from mcp.client.stdio import StdioServerParameters
-from mcp.types import CallToolResult, TextContent
+from mcp.shared.exceptions import McpError
+from mcp.shared.session import ProgressFnT
+from mcp.types import CONNECTION_CLOSED, CallToolResult, TextContent
+
+import tracing
+from env_config import env_flag, env_float
+from frame_transport import DEFAULT_FRAME_TRANSPORT, publish_frame
+from session_recorder import recorder
 
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 MCP_SERVER_PATH = PROJECT_ROOT / "mcp_server.py"
+# Connect to an already running server (``mcp_server.py --transport streamable-http``)
+# instead of spawning one over stdio, e.g. http://127.0.0.1:8000/mcp.
+MCP_SERVER_URL = os.getenv("EVERLY_MCP_URL")
+# Keep one session (and one stdio server process) open for all calls instead of
+# spawning the server per call. Turn off to pick up server edits on every call.
+PERSISTENT_SESSION = env_flag("EVERLY_MCP_PERSISTENT", True)
+# Seconds to wait for a tool's answer before treating the server as hung.
+CALL_TIMEOUT = timedelta(seconds=env_float("EVERLY_MCP_TIMEOUT", 120.0))
 
 
 def _content_blocks_to_text(result: CallToolResult) -> str:
@@ -32,25 +57,178 @@ def _content_blocks_to_text(result: CallToolResult) -> str:
     return "\n".join(texts).strip()
 
 
-async def _call_tool_async(tool_name: str, arguments: dict[str, Any] | None) -> CallToolResult:
-    params = StdioServerParameters(
+def _server_parameters() -> StdioServerParameters | StreamableHttpParameters:
+    if MCP_SERVER_URL:
+        return StreamableHttpParameters(url=MCP_SERVER_URL)
+    # Our own server: pass the full environment so EVERLY_* settings (tracing
+    # included) set in the shell apply to it, not only those in .env.
+    return StdioServerParameters(
         command=sys.executable,
         args=[str(MCP_SERVER_PATH)],
         cwd=str(PROJECT_ROOT),
+        env=dict(os.environ),
     )
 
+
+def _request_meta() -> Optional[dict[str, str]]:
+    """Request ``_meta``: the current trace span and, when recording, the call ID."""
+    meta = {**(tracing.inject_meta() or {}), **(recorder.inject_meta() or {})}
+    return meta or None
+
+
+def _progress_callback(on_captured: Optional[Callable[[], None]]) -> Optional[ProgressFnT]:
+    """Turn the server's "captured" progress message into a call to ``on_captured``."""
+    if on_captured is None:
+        return None
+
+    async def callback(progress: float, total: Optional[float], message: Optional[str]) -> None:
+        if message == "captured":
+            on_captured()
+
+    return callback
+
+
+async def _call_tool_async(
+    tool_name: str, arguments: dict[str, Any] | None, on_captured: Optional[Callable[[], None]] = None
+) -> CallToolResult:
+    params = _server_parameters()
+
     async with ClientSessionGroup() as group:
-        session = await group.connect_to_server(params)
+        with tracing.span("mcp_client.connect", cat="mcp"):
+            session = await group.connect_to_server(params)
         try:
-            result = await group.call_tool(tool_name, arguments or {})
+            # The server continues the trace from the span carried in _meta.
+            with tracing.span("mcp_client.request", cat="mcp", flow_out=True, tool=tool_name):
+                result = await group.call_tool(
+                    tool_name,
+                    arguments or {},
+                    read_timeout_seconds=CALL_TIMEOUT,
+                    progress_callback=_progress_callback(on_captured),
+                    meta=_request_meta(),
+                )
         finally:
             await group.disconnect_from_server(session)
     return result
 
 
-def _call_tool(tool_name: str, arguments: dict[str, Any] | None) -> str:
+# Tools that can safely run twice; only these are retried after a lost connection.
+READ_ONLY_TOOLS = frozenset({"screenshot_analysis", "extract_training_calendar", "upstream_stats"})
+
+
+def _connection_lost(exc: BaseException) -> bool:
+    """True for a send on a dead session, a session closed mid-request or a request that timed out."""
+    if isinstance(exc, (anyio.ClosedResourceError, anyio.BrokenResourceError)):
+        return True
+    return isinstance(exc, McpError) and exc.error.code in (CONNECTION_CLOSED, httpx.codes.REQUEST_TIMEOUT)
+
+
+class _PersistentSession:
+    """One MCP session held open on a background event loop and shared by all threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._portal_cm: Optional[AbstractContextManager[BlockingPortal]] = None
+        self._portal: Optional[BlockingPortal] = None
+        self._group: Optional[ClientSessionGroup] = None
+        self._closed: Optional[anyio.Event] = None
+        self._serving: Optional[Future] = None
+
+    async def _serve(self, *, task_status: TaskStatus = anyio.TASK_STATUS_IGNORED) -> None:
+        # The session's task groups must be entered and exited by the same task,
+        # so this task owns them for the session's lifetime.
+        async with ClientSessionGroup() as group:
+            with tracing.span("mcp_client.connect", cat="mcp"):
+                await group.connect_to_server(_server_parameters())
+            closed = anyio.Event()
+            task_status.started((group, closed))
+            await closed.wait()
+
+    def _connected(self) -> tuple[BlockingPortal, ClientSessionGroup]:
+        with self._lock:
+            if self._portal is None:
+                self._portal_cm = start_blocking_portal()
+                self._portal = self._portal_cm.__enter__()
+            if self._group is None:
+                self._serving, (self._group, self._closed) = self._portal.start_task(self._serve)
+            return self._portal, self._group
+
+    def warm_up(self) -> None:
+        """Connect now (spawning the stdio server) so the first question does not pay for it."""
+        self._connected()
+
+    def call_tool(
+        self, tool_name: str, arguments: dict[str, Any], on_captured: Optional[Callable[[], None]] = None
+    ) -> CallToolResult:
+        try:
+            return self._call_once(tool_name, arguments, on_captured)
+        except Exception as exc:
+            if not _connection_lost(exc):
+                raise
+            # The server went away (restart or crash) or stopped answering. The
+            # request may already have reached it, so only tools without side
+            # effects are sent again; the next call of any tool reconnects.
+            if tool_name not in READ_ONLY_TOOLS:
+                raise ConnectionError(
+                    "the connection to the MCP server was lost or timed out; not retried, please try again"
+                ) from exc
+            return self._call_once(tool_name, arguments, on_captured)
+
+    def _call_once(
+        self, tool_name: str, arguments: dict[str, Any], on_captured: Optional[Callable[[], None]] = None
+    ) -> CallToolResult:
+        portal, group = self._connected()
+        with tracing.span("mcp_client.request", cat="mcp", flow_out=True, tool=tool_name):
+            # Computed here: the portal's event loop does not see this thread's trace context.
+            call = functools.partial(
+                group.call_tool,
+                tool_name,
+                arguments,
+                read_timeout_seconds=CALL_TIMEOUT,
+                progress_callback=_progress_callback(on_captured),
+                meta=_request_meta(),
+            )
+            try:
+                return portal.call(call)
+            except Exception as exc:
+                if _connection_lost(exc):
+                    # A hung server is dropped too (a stdio one is stopped); the resend reconnects.
+                    self._disconnect(group)
+                raise
+
+    def _disconnect(self, group: Optional[ClientSessionGroup] = None) -> None:
+        with self._lock:
+            if self._group is None or (group is not None and group is not self._group):
+                return
+            closed, serving = self._closed, self._serving
+            self._group = self._closed = self._serving = None
+        try:
+            self._portal.call(closed.set)
+            serving.result(timeout=5)
+        except Exception:  # pragma: no cover - the session is already broken
+            pass
+
+    def close(self) -> None:
+        self._disconnect()
+        with self._lock:
+            portal_cm, self._portal_cm, self._portal = self._portal_cm, None, None
+        if portal_cm is not None:
+            portal_cm.__exit__(None, None, None)
+
+
+_session = _PersistentSession()
+atexit.register(_session.close)
+
+
+def _call_tool(
+    tool_name: str, arguments: dict[str, Any] | None, on_captured: Optional[Callable[[], None]] = None
+) -> str:
+    """Call a tool; ``on_captured`` runs (on another thread) once the server has captured the screen."""
     try:
-        result = anyio.run(_call_tool_async, tool_name, arguments)
+        with recorder.call(tool_name, arguments or {}), tracing.span("mcp_client.call_tool", cat="mcp", tool=tool_name):
+            if PERSISTENT_SESSION:
+                result = _session.call_tool(tool_name, arguments or {}, on_captured)
+            else:
+                result = anyio.run(_call_tool_async, tool_name, arguments, on_captured)
     except Exception as exc:  # pragma: no cover - error surface for UI
         return f"Error calling MCP tool '{tool_name}': {exc}"
 
@@ -61,11 +239,57 @@ def _call_tool(tool_name: str, arguments: dict[str, Any] | None) -> str:
 class EverlyAgent:
     """Facade offering high-level actions backed by MCP tools."""
 
-    def analyze_screenshot_with_question(self, question: str) -> str:
+    def warm_up(self) -> None:
+        """Open the shared MCP session ahead of the first question."""
+        if PERSISTENT_SESSION:
+            _session.warm_up()
+
+    def close(self) -> None:
+        """Close the shared MCP session (it is also closed at exit)."""
+        _session.close()
+
+    def analyze_screenshot_with_question(
+        self,
+        question: str,
+        capture_mode: str = "full",
+        region: Optional[Sequence[int]] = None,
+        on_captured: Optional[Callable[[], None]] = None,
+    ) -> str:
         if not question:
             return "Please provide a question to analyze."
 
-        return _call_tool("screenshot_analysis", {"question": question})
+        arguments: dict[str, Any] = {"question": question, "capture_mode": capture_mode}
+        if region is not None:
+            arguments["region"] = list(region)
+        return _call_tool("screenshot_analysis", arguments, on_captured)
+
+    def analyze_frame_with_question(self, question: str, image, transport: str = DEFAULT_FRAME_TRANSPORT) -> str:
+        """Analyze an image captured in this process, handing it over by shared memory."""
+        if not question:
+            return "Please provide a question to analyze."
+
+        # The segment lives only for the duration of the call.
+        with publish_frame(image, transport) as frame:
+            return _call_tool("screenshot_analysis", {"question": question, "frame": frame.handle})
+
+    def extract_training_calendar(
+        self,
+        capture_mode: str = "full",
+        region: Optional[Sequence[int]] = None,
+    ) -> str:
+        """Return the on-screen training calendar as a JSON string."""
+        arguments: dict[str, Any] = {"capture_mode": capture_mode}
+        if region is not None:
+            arguments["region"] = list(region)
+        return _call_tool("extract_training_calendar", arguments)
+
+    def extract_training_calendar_from_frame(self, image, transport: str = DEFAULT_FRAME_TRANSPORT) -> str:
+        """Return the training calendar in an image from this process as a JSON string."""
+        with publish_frame(image, transport) as frame:
+            return _call_tool("extract_training_calendar", {"frame": frame.handle})
+
+    def upstream_stats(self) -> str:
+        return _call_tool("upstream_stats", {})
 
     def schedule_workout(self, date_text: str) -> str:
         return _call_tool("schedule_workout", {"date": date_text})
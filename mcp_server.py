@@ -2,37 +2,178 @@
 
 from __future__ import annotations
 
-import base64
+import argparse
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import multiprocessing
 import os
-from io import BytesIO
-from pathlib import Path
-from typing import Optional
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
 
 import dateparser
-import pyautogui
 import requests
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
 from mcp.types import TextContent
 from openai import OpenAI
 
+import profiling
+import tracing
+from env_config import env_float, env_int
+from frame_transport import encode_published_frame, validate_frame_handle
+from history_store import HISTORY_ENABLED, history
+from image_encoding import EncodedFrame
+from layout_spec import SAMPLE_MODE, get_layout_spec
+from model_router import ModelRouter, ModelTier, TierResult
+from reference_assets import SAMPLE_ASSET, EncodedAsset, reference_assets
+from resilience import CircuitOpenError, get_upstream_guard, upstream_stats
+from session_recorder import recorder
+from screen_capture import CAPTURE_MODES, DEFAULT_CAPTURE_MODE, capture_encoded_frame, normalize_region
+from training_calendar import (
+    LOCAL_CALENDAR_ANSWERS,
+    CalendarExtractionError,
+    answer_calendar_question,
+    calendar_cache,
+    parse_calendar_question,
+)
+from usage_ledger import estimate_image_tokens, ledger
+
 
 load_dotenv()
 
-PROJECT_ROOT = Path(__file__).resolve().parent
-SAMPLE_IMAGE_PATH = PROJECT_ROOT / "train_static" / "coach_tabTraning.png"
+logger = logging.getLogger(__name__)
 
+# Make.com scenarios; overridable so load tests can point them at local stand-ins.
+SCHEDULE_WEBHOOK_URL = os.getenv(
+    "EVERLY_SCHEDULE_WEBHOOK_URL", "https://hook.eu2.make.com/9ty1og2anuaz4f8xdpvde7pxtkc12sxq"
+)
+MESSAGE_WEBHOOK_URL = os.getenv(
+    "EVERLY_MESSAGE_WEBHOOK_URL", "https://hook.us2.make.com/m8j6cxm9st36azfve84ve1x7fbgmxbtt"
+)
 
-def _encode_image_to_base64(image) -> str:
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode()
 
+# Blocking I/O (HTTP, OpenAI, disk) runs on threads; capture, resizing and
+# PNG encoding run in worker processes so they never hold the event loop or GIL.
+IO_WORKERS = env_int("EVERLY_IO_WORKERS", 8)
+CPU_WORKERS = env_int("EVERLY_CPU_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+MAX_IMAGE_SIDE = env_int("EVERLY_MAX_IMAGE_SIDE", None)
+# Seconds during which a server-capture question joins an identical one
+# (same question, mode and region) before capturing; 0 turns this off.
+CAPTURE_SHARE_WINDOW = env_float("EVERLY_SINGLE_FLIGHT_WINDOW", 2.0)
 
-def _load_sample_image_base64() -> Optional[str]:
-    if SAMPLE_IMAGE_PATH.exists():
-        return base64.b64encode(SAMPLE_IMAGE_PATH.read_bytes()).decode()
-    return None
+T = TypeVar("T")
+
+_openai_guard = get_upstream_guard("OpenAI")
+_model_router = ModelRouter()
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="everly-io")
+    return _thread_pool
+
+
+def _detach_stdio() -> None:
+    """Point fds 0 and 1 at os.devnull (pool worker initializer).
+
+    Over stdio they are the MCP pipe; a worker holding them keeps the client
+    from seeing EOF after the server is gone.
+    """
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+
+@contextlib.contextmanager
+def _stdio_detached():
+    """Point this process's fds 0 and 1 at os.devnull while children are started.
+
+    Only use it before the transport runs: nothing may read or write the MCP
+    pipe in the meantime.
+    """
+    sys.stdout.flush()
+    saved = os.dup(0), os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        yield
+    finally:
+        os.dup2(saved[0], 0)
+        os.dup2(saved[1], 1)
+        for fd in (devnull, *saved):
+            os.close(fd)
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that already runs an event loop and threads is unsafe.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_detach_stdio
+        )
+    return _process_pool
+
+
+def _shutdown_pools(wait: bool = False) -> None:
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(_shutdown_pools)
+
+
+def _terminate(signum: int, frame: Any) -> None:
+    """SIGTERM/SIGINT: stop and reap the pool workers, then die of the same signal.
+
+    atexit handlers do not run when a signal kills the process, and the
+    reloader, the replay driver and the stdio client all stop the server that way.
+    """
+    _shutdown_pools(wait=True)
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+async def _run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (the current trace span and profile) onto the worker thread.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _get_thread_pool(), functools.partial(context.run, profiling.run, func, *args, **kwargs)
+    )
+
+
+async def _run_cpu(func: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_process_pool(), functools.partial(func, *args))
+
+
+def _load_sample_reference(sample_mode: str = SAMPLE_MODE) -> tuple[Optional[EncodedAsset], Optional[str]]:
+    """Return ``(sample, layout_spec)``: the distilled spec when available, else the encoded image."""
+    sample = reference_assets.get(SAMPLE_ASSET)
+    if sample is None:
+        return None, None
+    if sample_mode == "spec":
+        layout_spec = get_layout_spec(sample.data, digest=sample.content_hash)
+        if layout_spec:
+            return None, layout_spec
+    # The sample is downscaled like the screenshots it accompanies.
+    return sample.encoded(MAX_IMAGE_SIDE), None
 
 
 def _parse_future_date(text: str) -> Optional[str]:
@@ -42,10 +183,47 @@ def _parse_future_date(text: str) -> Optional[str]:
     return None
 
 
-def _call_openai_for_screenshot(question: str, screenshot_b64: str, sample_b64: Optional[str]) -> str:
+def _webhook_status(response) -> str:
+    return "ok" if response.status_code == 200 else f"http_{response.status_code}"
+
+
+def _response_text(response) -> str:
+    if getattr(response, "output_text", None):
+        return response.output_text.strip()
+
+    # Fallback: rebuild from output items if output_text not populated
+    texts: list[str] = []
+    for item in getattr(response, "output", []) or []:
+        for content_block in getattr(item, "content", []) or []:
+            if getattr(content_block, "type", None) == "output_text":
+                texts.append(getattr(content_block, "text", ""))
+    return "\n".join(filter(None, texts)).strip()
+
+
+def _response_usage(response) -> tuple[int, int]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+
+
+class _OpenAINotConfiguredError(RuntimeError):
+    pass
+
+
+def _ask_openai_for_screenshot(
+    question: str,
+    screenshot_url: str,
+    sample_url: Optional[str],
+    layout_spec: Optional[str] = None,
+    image_tokens: int = 0,
+) -> str:
+    """Answer ``question`` about the screenshot; raises when OpenAI cannot be asked."""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        return "OPENAI_API_KEY is not configured. Please set it in your environment or .env file."
+        raise _OpenAINotConfiguredError(
+            "OPENAI_API_KEY is not configured. Please set it in your environment or .env file."
+        )
 
     client = OpenAI(api_key=api_key)
 
@@ -60,7 +238,17 @@ def _call_openai_for_screenshot(question: str, screenshot_b64: str, sample_b64:
         },
     ]
 
-    if sample_b64:
+    if layout_spec:
+        content.append(
+            {
+                "type": "input_text",
+                "text": (
+                    "Reference layout of the Everfit training tab, distilled from a sample screenshot. "
+                    f"Use it only as structural guidance:\n{layout_spec}"
+                ),
+            }
+        )
+    elif sample_url:
         content.extend(
             [
                 {
@@ -70,37 +258,45 @@ def _call_openai_for_screenshot(question: str, screenshot_b64: str, sample_b64:
                         "Use it only as structural guidance."
                     ),
                 },
-                {"type": "input_image", "image_url": f"data:image/png;base64,{sample_b64}"},
+                {"type": "input_image", "image_url": sample_url},
             ]
         )
 
     content.extend(
         [
             {"type": "input_text", "text": f"User question: {question}"},
-            {"type": "input_image", "image_url": f"data:image/png;base64,{screenshot_b64}"},
+            {"type": "input_image", "image_url": screenshot_url},
         ]
     )
 
-    try:
-        response = client.responses.create(
-            model="gpt-4o-mini",
+    def request(tier: ModelTier) -> TierResult:
+        response = _openai_guard.call(
+            client.responses.create,
+            model=tier.model,
+            temperature=tier.temperature,
             input=[{"role": "user", "content": content}],
             max_output_tokens=700,
         )
-    except Exception as exc:  # pragma: no cover - network error handling
-        return f"Error calling OpenAI API: {exc}"
+        input_tokens, output_tokens = _response_usage(response)
+        return TierResult(_response_text(response), input_tokens, output_tokens)
 
-    if getattr(response, "output_text", None):
-        return "\n".join(response.output_text).strip()
+    return _model_router.run(question, request, image_tokens=image_tokens) or "No response generated by the model."
 
-    # Fallback: rebuild from output items if output_text not populated
-    texts: list[str] = []
-    for item in getattr(response, "output", []) or []:
-        for content_block in getattr(item, "content", []) or []:
-            if getattr(content_block, "type", None) == "output_text":
-                texts.append(getattr(content_block, "text", ""))
 
-    return "\n".join(filter(None, texts)) or "No response generated by the model."
+def _call_openai_for_screenshot(
+    question: str,
+    screenshot_url: str,
+    sample_url: Optional[str],
+    layout_spec: Optional[str] = None,
+    image_tokens: int = 0,
+) -> str:
+    """Like ``_ask_openai_for_screenshot`` but failures come back as the answer text."""
+    try:
+        return _ask_openai_for_screenshot(question, screenshot_url, sample_url, layout_spec, image_tokens)
+    except (CircuitOpenError, _OpenAINotConfiguredError) as exc:
+        return str(exc)
+    except Exception as exc:  # pragma: no cover - network error handling
+        return f"Error calling OpenAI API: {exc}"
 
 
 server = FastMCP(
@@ -109,21 +305,297 @@ server = FastMCP(
 )
 
 
+def _traced_tool(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Run a tool inside a span continuing the caller's trace from the request ``_meta``.
+
+    A call ID in the ``_meta`` from a recording client is kept for the duration,
+    so the session recorder can attribute frames and upstream requests to it.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        request_context = server.get_context().request_context
+        meta = request_context.meta if request_context else None
+        parent = tracing.extract_meta(meta)
+        with recorder.serving(meta), tracing.span(f"tool.{func.__name__}", cat="mcp", parent=parent, flow_in=True):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def _profiled_tool(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Profile a tool call when it passes ``profile=true`` (or ``EVERLY_PROFILE`` is set).
+
+    The profile covers this call's steps on the event loop and the I/O threads
+    it uses; the files are written on a worker thread and their paths appended
+    to the result.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not (kwargs.get("profile") or profiling.PROFILE_ALL):
+            return await func(*args, **kwargs)
+        result, profile = await profiling.profiled_call(func.__name__, func(*args, **kwargs), enabled=True)
+        await _run_blocking(profile.write)
+        return [*result, TextContent(type="text", text=profile.describe())]
+
+    return wrapper
+
+
+class _SingleFlight:
+    """Coalesce identical concurrent tool calls onto one in-flight execution.
+
+    The first call for a key runs the work as its own task; duplicates that
+    arrive while it is in flight await the same task instead of repeating the
+    upstream requests. Callers are shielded from each other, so a client that
+    disconnects does not cancel the work for the others. Profiled calls are
+    never coalesced, so a profile always covers the work it asked for.
+    With ``window``, only calls started at most that many seconds after the
+    in-flight one join it.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, tuple[asyncio.Task, float]] = {}
+        self._leaders: dict[str, int] = {}
+        self._coalesced: dict[str, int] = {}
+
+    async def do(
+        self, tool: str, key: Hashable, work: Callable[[], Awaitable[T]], window: Optional[float] = None
+    ) -> T:
+        if profiling.current() is not None:
+            return await work()
+        key = (tool, key)
+        now = asyncio.get_running_loop().time()
+        task, started = self._calls.get(key, (None, 0.0))
+        if task is not None and (window is None or now - started <= window):
+            self._coalesced[tool] = self._coalesced.get(tool, 0) + 1
+            with tracing.span("singleflight.wait", cat="mcp", tool=tool):
+                return await asyncio.shield(task)
+
+        self._leaders[tool] = self._leaders.get(tool, 0) + 1
+        task = asyncio.ensure_future(work())
+        self._calls[key] = (task, now)
+        task.add_done_callback(functools.partial(self._finished, key))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        # A later leader may have taken the key over once the window passed.
+        if self._calls.get(key, (None,))[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieve the exception so it is not reported as unhandled when every caller left.
+            task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "executed": dict(self._leaders),
+            "coalesced": dict(self._coalesced),
+        }
+
+
+_single_flight = _SingleFlight()
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+async def _acquire_screenshot(
+    capture_mode: str,
+    region: Optional[list[int]],
+    frame: Optional[dict[str, Any]],
+) -> EncodedFrame:
+    """Capture the screen, or encode a shared frame; ``ValueError`` carries a user-facing message."""
+    screenshot = await _encode_screenshot(capture_mode, region, frame)
+    await _report_captured()
+    if recorder.recording:
+        await _run_blocking(recorder.frame, screenshot)
+    return screenshot
+
+
+async def _report_captured() -> None:
+    """Tell a client that asked for progress that the screen is captured.
+
+    The UI keeps its own windows off the screen until then, so they never end
+    up in the frame (and in its content hash). Sent only when the request
+    carries a progress token.
+    """
+    try:
+        await server.get_context().report_progress(1, 2, "captured")
+    except ValueError:  # called outside a request, e.g. from a benchmark
+        pass
+
+
+async def _encode_screenshot(
+    capture_mode: str,
+    region: Optional[list[int]],
+    frame: Optional[dict[str, Any]],
+) -> EncodedFrame:
+    if frame is not None:
+        try:
+            validate_frame_handle(frame)
+        except ValueError as exc:
+            raise ValueError(f"Invalid frame handle: {exc}") from exc
+        try:
+            with tracing.span("encode_shared_frame", cat="capture", transport=frame.get("transport")):
+                return await _run_cpu(encode_published_frame, frame, MAX_IMAGE_SIDE)
+        except FileNotFoundError as exc:
+            raise ValueError("The shared screenshot frame is no longer available.") from exc
+
+    if capture_mode not in CAPTURE_MODES:
+        raise ValueError(f"Unknown capture mode '{capture_mode}'. Expected one of: {', '.join(CAPTURE_MODES)}.")
+    with tracing.span("capture_screen", cat="capture", capture_mode=capture_mode):
+        return await _run_cpu(capture_encoded_frame, capture_mode, region, MAX_IMAGE_SIDE)
+
+
+async def _remember(
+    question: str,
+    answer: str,
+    screenshot: EncodedFrame,
+    capture_mode: str,
+    frame: Optional[dict[str, Any]],
+) -> None:
+    """Add an answered question to the searchable history the UI reads."""
+    if not HISTORY_ENABLED:
+        return
+    try:
+        await _run_blocking(
+            history.add,
+            question,
+            answer,
+            screen_hash=screenshot.frame_hash,
+            capture_mode="frame" if frame is not None else capture_mode,
+        )
+    except Exception as exc:  # pragma: no cover - history is best effort
+        logger.warning("Could not record history: %s", exc)
+
+
 @server.tool(
     name="screenshot_analysis",
     description=(
         "Capture the current screen, forward it to OpenAI together with the user's question, "
-        "and return a detailed analysis of what is visible."
+        "and return a detailed analysis of what is visible. capture_mode is one of "
+        f"{', '.join(CAPTURE_MODES)}; 'monitor' and 'region' take region=[left, top, width, height]. "
+        "A frame handle from a local producer (shared memory or mapped file) replaces the capture."
     ),
 )
-def screenshot_analysis(question: str) -> list[TextContent]:
-    screenshot = pyautogui.screenshot()
-    screenshot_b64 = _encode_image_to_base64(screenshot)
-    sample_b64 = _load_sample_image_base64()
-    answer = _call_openai_for_screenshot(question, screenshot_b64, sample_b64)
+@_traced_tool
+@_profiled_tool
+async def screenshot_analysis(
+    question: str,
+    capture_mode: str = DEFAULT_CAPTURE_MODE,
+    region: Optional[list[int]] = None,
+    frame: Optional[dict[str, Any]] = None,
+    profile: bool = False,
+) -> list[TextContent]:
+    if frame is None and CAPTURE_SHARE_WINDOW:
+        # Two captures a moment apart almost never hash alike (a clock, a
+        # cursor), so repeats of the same request share the first one's
+        # capture and answer.
+        return await _single_flight.do(
+            "screenshot_analysis/capture",
+            (_normalize_text(question).casefold(), capture_mode, tuple(region or ())),
+            functools.partial(_capture_and_analyze, question, capture_mode, region, frame),
+            window=CAPTURE_SHARE_WINDOW,
+        )
+    return await _capture_and_analyze(question, capture_mode, region, frame)
+
+
+async def _capture_and_analyze(
+    question: str,
+    capture_mode: str,
+    region: Optional[list[int]],
+    frame: Optional[dict[str, Any]],
+) -> list[TextContent]:
+    try:
+        screenshot = await _acquire_screenshot(capture_mode, region, frame)
+    except ValueError as exc:
+        return [TextContent(type="text", text=str(exc))]
+
+    # The same question about an identical frame shares one answer, however
+    # the screen reached the server.
+    return await _single_flight.do(
+        "screenshot_analysis",
+        (_normalize_text(question).casefold(), screenshot.content_hash),
+        functools.partial(_analyze_screenshot, question, screenshot, capture_mode, frame),
+    )
+
+
+async def _analyze_screenshot(
+    question: str,
+    screenshot: EncodedFrame,
+    capture_mode: str,
+    frame: Optional[dict[str, Any]],
+) -> list[TextContent]:
+    # Calendar counts and lookups are answered from the cached calendar JSON.
+    calendar_question = parse_calendar_question(question) if LOCAL_CALENDAR_ANSWERS else None
+    if calendar_question is not None:
+        try:
+            calendar = await _run_blocking(calendar_cache.get_or_extract, screenshot)
+        except Exception as exc:  # the vision path below reports configuration and upstream errors
+            logger.warning("Calendar extraction failed, answering with vision instead: %s", exc)
+            calendar = None
+        answer = answer_calendar_question(calendar, calendar_question) if calendar else None
+        if answer:
+            await _remember(question, answer, screenshot, capture_mode, frame)
+            return [TextContent(type="text", text=answer)]
+
+    sample, layout_spec = await _run_blocking(_load_sample_reference)
+    image_tokens = estimate_image_tokens(screenshot.width, screenshot.height)
+    sample_url = None
+    if sample is not None:
+        # Estimate from the size actually sent, not the file on disk.
+        sample_url = sample.data_url
+        image_tokens += estimate_image_tokens(sample.width, sample.height)
+    try:
+        answer = await _run_blocking(
+            _ask_openai_for_screenshot, question, screenshot.data_url, sample_url, layout_spec, image_tokens
+        )
+    except (CircuitOpenError, _OpenAINotConfiguredError) as exc:
+        return [TextContent(type="text", text=str(exc))]
+    except Exception as exc:  # pragma: no cover - network error handling
+        return [TextContent(type="text", text=f"Error calling OpenAI API: {exc}")]
+
+    await _remember(question, answer, screenshot, capture_mode, frame)
     return [TextContent(type="text", text=answer)]
 
 
+@server.tool(
+    name="extract_training_calendar",
+    description=(
+        "Extract the Everfit two-week training calendar on screen as JSON (weeks, days, workouts, "
+        "exercises with sets, reps and intensity). Results are cached per distinct screen."
+    ),
+)
+@_traced_tool
+@_profiled_tool
+async def extract_training_calendar(
+    capture_mode: str = DEFAULT_CAPTURE_MODE,
+    region: Optional[list[int]] = None,
+    frame: Optional[dict[str, Any]] = None,
+    profile: bool = False,
+) -> list[TextContent]:
+    try:
+        screenshot = await _acquire_screenshot(capture_mode, region, frame)
+    except ValueError as exc:
+        return [TextContent(type="text", text=str(exc))]
+
+    try:
+        calendar = await _single_flight.do(
+            "extract_training_calendar",
+            screenshot.content_hash,
+            functools.partial(_run_blocking, calendar_cache.get_or_extract, screenshot),
+        )
+    except (CircuitOpenError, CalendarExtractionError) as exc:
+        return [TextContent(type="text", text=str(exc))]
+    except Exception as exc:  # pragma: no cover - network error handling
+        return [TextContent(type="text", text=f"Error calling OpenAI API: {exc}")]
+    if calendar is None:
+        return [TextContent(type="text", text="No Everfit training calendar was found on screen.")]
+    return [TextContent(type="text", text=json.dumps(calendar, ensure_ascii=False))]
+
+
 @server.tool(
     name="schedule_workout",
     description=(
@@ -131,21 +603,36 @@ def screenshot_analysis(question: str) -> list[TextContent]:
         "which will be interpreted as the nearest future date."
     ),
 )
-def schedule_workout(date: str) -> list[TextContent]:
-    parsed = _parse_future_date(date)
+@_traced_tool
+@_profiled_tool
+async def schedule_workout(date: str, profile: bool = False) -> list[TextContent]:
+    parsed = await _run_blocking(_parse_future_date, date)
     if not parsed:
         return [TextContent(type="text", text="Không hiểu ngày bạn cung cấp.")]
 
+    # Keyed on the parsed date, so "tomorrow" and "ngày mai" book once.
+    return await _single_flight.do("schedule_workout", parsed, functools.partial(_post_schedule, parsed))
+
+
+async def _post_schedule(parsed: str) -> list[TextContent]:
     payload = {"name": "Workout with Everfit", "Date": parsed}
+    started = time.perf_counter()
     try:
-        response = requests.post(
-            "https://hook.eu2.make.com/9ty1og2anuaz4f8xdpvde7pxtkc12sxq",
-            json=payload,
-            timeout=10,
-        )
+        with tracing.span("make.schedule_workout", cat="upstream"):
+            response = await _run_blocking(
+                requests.post,
+                SCHEDULE_WEBHOOK_URL,
+                json=payload,
+                timeout=10,
+            )
     except requests.RequestException as exc:  # pragma: no cover - network error handling
+        ledger.record("schedule_workout", latency_s=time.perf_counter() - started, status="error")
         return [TextContent(type="text", text=f"❌ Lỗi khi đặt lịch: {exc}")]
 
+    ledger.record(
+        "schedule_workout", latency_s=time.perf_counter() - started, status=_webhook_status(response)
+    )
+
     if response.status_code == 200:
         return [TextContent(type="text", text=f"✅ Đã đặt lịch tập vào {parsed}")]
 
@@ -156,26 +643,81 @@ def schedule_workout(date: str) -> list[TextContent]:
     name="send_message_to_client",
     description="Gửi tin nhắn tới học viên thông qua webhook Make.com.",
 )
-def send_message_to_client(message: str) -> list[TextContent]:
+@_traced_tool
+@_profiled_tool
+async def send_message_to_client(message: str, profile: bool = False) -> list[TextContent]:
+    return await _single_flight.do(
+        "send_message_to_client", _normalize_text(message), functools.partial(_post_message, message)
+    )
+
+
+async def _post_message(message: str) -> list[TextContent]:
     payload = {"message": message}
+    started = time.perf_counter()
     try:
-        response = requests.post(
-            "https://hook.us2.make.com/m8j6cxm9st36azfve84ve1x7fbgmxbtt",
-            json=payload,
-            timeout=10,
-        )
+        with tracing.span("make.send_message_to_client", cat="upstream"):
+            response = await _run_blocking(
+                requests.post,
+                MESSAGE_WEBHOOK_URL,
+                json=payload,
+                timeout=10,
+            )
     except requests.RequestException as exc:  # pragma: no cover - network error handling
+        ledger.record("send_message_to_client", latency_s=time.perf_counter() - started, status="error")
         return [TextContent(type="text", text=f"❌ Gửi tin nhắn thất bại: {exc}")]
 
+    ledger.record(
+        "send_message_to_client", latency_s=time.perf_counter() - started, status=_webhook_status(response)
+    )
+
     if response.status_code == 200:
         return [TextContent(type="text", text=f"✅ Đã gửi tin nhắn: {message}")]
 
     return [TextContent(type="text", text=f"❌ Gửi tin nhắn thất bại. Mã lỗi: {response.status_code}")]
 
 
+@server.tool(
+    name="upstream_stats",
+    description=(
+        "Report hedging, circuit breaker, per-model-tier latency/cost and "
+        "coalesced duplicate call statistics."
+    ),
+)
+@_traced_tool
+async def upstream_stats_tool() -> list[TextContent]:
+    stats = {
+        "upstream": upstream_stats(),
+        "model_tiers": _model_router.stats(),
+        "single_flight": _single_flight.stats(),
+    }
+    return [TextContent(type="text", text=json.dumps(stats, indent=2))]
+
+
 def main() -> None:
-    """Entry point for running the MCP server over stdio."""
-    server.run(transport="stdio")
+    """Entry point for running the MCP server (stdio by default)."""
+    parser = argparse.ArgumentParser(description="Everly MCP server")
+    parser.add_argument("--transport", choices=("stdio", "streamable-http"), default="stdio")
+    parser.add_argument("--host", default=server.settings.host)
+    parser.add_argument("--port", type=int, default=server.settings.port)
+    args = parser.parse_args()
+
+    # Over HTTP the server outlives individual clients, which lets the dev
+    # reloader restart it on its own when only server code changes.
+    tracing.set_process_name("Everly MCP server")
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _terminate)
+    # Spawn the capture/encode workers (and their imports) while the client is
+    # still connecting, so the first screenshot does not pay for it. The
+    # resource tracker started with them (and reused by shared-memory frames)
+    # would otherwise hold the stdio pipe for the server's whole life.
+    with _stdio_detached():
+        _get_process_pool().submit(normalize_region, None)
+    # Likewise read the sample and distil (or pre-encode) it, so the first
+    # question does not wait for a layout distillation.
+    _get_thread_pool().submit(_load_sample_reference)
+    server.settings.host = args.host
+    server.settings.port = args.port
+    server.run(transport=args.transport)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+"""Latency-tiered model routing for screen questions.
+
+Simple lookups ("what day is the leg workout?") go to the fast tier; analyses
+go to the strong tier. A fast answer that comes back empty or hedged is
+escalated to the strong tier automatically. The model table can be overridden
+with ``EVERLY_MODEL_TABLE`` (inline JSON or a path to a JSON file), e.g.::
+
+    {"fast": {"model": "gpt-4o-mini"}, "strong": {"model": "gpt-4o", "temperature": 0.2}}
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import tracing
+from usage_ledger import ledger
+
+
+logger = logging.getLogger(__name__)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+AGENT_TIER = "agent"
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    temperature: float = 0.0
+    # USD per million tokens
+    input_cost: float = 0.0
+    output_cost: float = 0.0
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (input_tokens * self.input_cost + output_tokens * self.output_cost) / 1_000_000
+
+
+DEFAULT_MODEL_TABLE: dict[str, ModelTier] = {
+    FAST_TIER: ModelTier(FAST_TIER, "gpt-4o-mini", 0.0, 0.15, 0.60),
+    STRONG_TIER: ModelTier(STRONG_TIER, "gpt-4o", 0.0, 2.50, 10.00),
+    AGENT_TIER: ModelTier(AGENT_TIER, "gpt-4o", 0.5, 2.50, 10.00),
+}
+
+
+@dataclass
+class TierResult:
+    """What a model call returns to the router."""
+
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+def load_model_table(source: Optional[str] = None) -> dict[str, ModelTier]:
+    """Merge overrides from ``source`` (JSON or a JSON file path) into the default table."""
+    source = source if source is not None else os.getenv("EVERLY_MODEL_TABLE")
+    table = dict(DEFAULT_MODEL_TABLE)
+    if not source:
+        return table
+
+    text = source.strip()
+    if not text.startswith("{"):
+        text = Path(text).expanduser().read_text(encoding="utf-8")
+    overrides: dict[str, dict[str, Any]] = json.loads(text)
+
+    for name, values in overrides.items():
+        base = table.get(name, ModelTier(name, values.get("model", "")))
+        table[name] = replace(base, **{key: value for key, value in values.items() if key != "name"})
+    return table
+
+
+_LOOKUP_PATTERN = re.compile(
+    r"^\s*(what|which|when|where|who|is|are|does|do|how many|how much|list|show|find|name)\b",
+    re.IGNORECASE,
+)
+_ANALYSIS_PATTERN = re.compile(
+    r"\b(why|analy[sz]e|analysis|compare|evaluate|assess|recommend|suggest|improve|explain|"
+    r"summari[sz]e|review|plan|progress|balanced?|optimi[sz]e|should)\b",
+    re.IGNORECASE,
+)
+_LOW_CONFIDENCE_PATTERN = re.compile(
+    r"\b(i('m| am) not sure|i can(no|')t (see|tell|determine|read|find)|unable to (see|determine|read|find)|"
+    r"not (clearly )?visible|unclear|hard to (tell|read)|cannot be determined|no response generated)\b",
+    re.IGNORECASE,
+)
+_MAX_LOOKUP_WORDS = 16
+
+
+@functools.lru_cache(maxsize=4)
+def _tiers_by_model(source: Optional[str]) -> dict[str, ModelTier]:
+    tiers: dict[str, ModelTier] = {}
+    for tier in load_model_table(source).values():
+        tiers.setdefault(tier.model, tier)
+    return tiers
+
+
+def model_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Cost of a call to ``model`` using the first tier in the table that uses it.
+
+    The table is loaded once per ``EVERLY_MODEL_TABLE`` value, not per call.
+    """
+    tier = _tiers_by_model(os.getenv("EVERLY_MODEL_TABLE") or "").get(model)
+    return tier.cost(input_tokens, output_tokens) if tier is not None else 0.0
+
+
+def classify_question(question: str) -> str:
+    """Pick the starting tier for ``question``."""
+    if _ANALYSIS_PATTERN.search(question):
+        return STRONG_TIER
+    if _LOOKUP_PATTERN.search(question) and len(question.split()) <= _MAX_LOOKUP_WORDS:
+        return FAST_TIER
+    return STRONG_TIER
+
+
+def is_low_confidence(answer: str) -> bool:
+    """True when an answer is empty or explicitly unsure, so a stronger model should retry."""
+    return not answer.strip() or bool(_LOW_CONFIDENCE_PATTERN.search(answer))
+
+
+@dataclass
+class _TierStats:
+    calls: int = 0
+    escalations: int = 0
+    latency_s: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+
+class ModelRouter:
+    """Route questions to a model tier and escalate low-confidence answers."""
+
+    def __init__(self, table: Optional[dict[str, ModelTier]] = None) -> None:
+        self.table = table if table is not None else load_model_table()
+        self._stats: dict[str, _TierStats] = {}
+        self._lock = threading.Lock()
+
+    def tier(self, name: str) -> ModelTier:
+        return self.table[name]
+
+    def ladder(self, question: str) -> list[ModelTier]:
+        """Tiers to try in order for ``question``."""
+        if classify_question(question) == FAST_TIER:
+            return [self.table[FAST_TIER], self.table[STRONG_TIER]]
+        return [self.table[STRONG_TIER]]
+
+    def run(
+        self,
+        question: str,
+        call: Callable[[ModelTier], TierResult],
+        tool: str = "screenshot_analysis",
+        image_tokens: int = 0,
+    ) -> str:
+        """Call tiers in order until one gives a confident answer; return the last answer.
+
+        Every tier call is logged and appended to the usage ledger under ``tool``;
+        ``image_tokens`` is the estimated share of input tokens spent on images.
+        """
+        ladder = self.ladder(question)
+        answer = ""
+        for position, tier in enumerate(ladder):
+            started = time.perf_counter()
+            try:
+                with tracing.span(f"openai.{tier.name}", cat="upstream", tool=tool, model=tier.model):
+                    result = call(tier)
+            except Exception:
+                ledger.record(tool, tier.model, time.perf_counter() - started, status="error")
+                raise
+            latency = time.perf_counter() - started
+            self._record(tier, latency, result)
+            ledger.record(
+                tool,
+                tier.model,
+                latency,
+                result.input_tokens,
+                result.output_tokens,
+                image_tokens,
+                tier.cost(result.input_tokens, result.output_tokens),
+            )
+            answer = result.text
+
+            escalate = position + 1 < len(ladder) and is_low_confidence(answer)
+            logger.info(
+                "tier=%s model=%s latency=%.2fs tokens_in=%d tokens_out=%d cost=$%.5f%s",
+                tier.name,
+                tier.model,
+                latency,
+                result.input_tokens,
+                result.output_tokens,
+                tier.cost(result.input_tokens, result.output_tokens),
+                " -> escalating" if escalate else "",
+            )
+            if not escalate:
+                break
+            with self._lock:
+                self._stats[tier.name].escalations += 1
+        return answer
+
+    def _record(self, tier: ModelTier, latency: float, result: TierResult) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(tier.name, _TierStats())
+            stats.calls += 1
+            stats.latency_s += latency
+            stats.input_tokens += result.input_tokens
+            stats.output_tokens += result.output_tokens
+            stats.cost_usd += tier.cost(result.input_tokens, result.output_tokens)
+            stats.latencies.append(latency)
+            del stats.latencies[:-200]
+
+    def stats(self) -> dict[str, Any]:
+        """Per-tier call counts, escalations, mean/p95 latency and spend."""
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                latencies = sorted(stats.latencies)
+                report[name] = {
+                    "model": self.table[name].model,
+                    "calls": stats.calls,
+                    "escalations": stats.escalations,
+                    "mean_latency_s": round(stats.latency_s / stats.calls, 3),
+                    "p95_latency_s": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 3),
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "cost_usd": round(stats.cost_usd, 5),
+                }
+            return report
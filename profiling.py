@@ -0,0 +1,309 @@
+"""On-demand profiling of single requests.
+
+Wrap a unit of work in :func:`profiled`, or a coroutine in
+:func:`profiled_call`; blocking work it hands to other threads goes through
+:func:`run` so it is attributed to the same profile. On the event loop only the
+steps of the profiled coroutine are recorded, not the other requests the loop
+runs while it waits.
+Each profile writes two files to ``EVERLY_PROFILE_DIR`` (default
+``.everly_cache/profiles``), of which the newest ``EVERLY_PROFILE_KEEP`` are
+kept:
+
+* ``<name>.pstats``, for ``python -m pstats`` or snakeviz.
+* ``<name>.collapsed``, with one ``frame;frame;... count`` line per sampled
+  stack, for flamegraph.pl or speedscope.
+
+``EVERLY_PROFILE=1`` profiles every request. Otherwise a caller turns it on
+for one request (the MCP tools take ``profile=true``). ``EVERLY_PROFILE_MODE``
+chooses the profiler:
+
+* ``sample`` (the default) reads the stacks of the participating threads every
+  ``EVERLY_PROFILE_INTERVAL`` seconds. Its pstats are built from the samples.
+* ``cprofile`` traces every call with :mod:`cProfile` and samples as well, for
+  the collapsed stacks.
+
+When no profile is active, :func:`profiled` and :func:`run` cost a flag check
+or a context variable lookup.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import cProfile
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Generator, Iterator, Optional, TypeVar
+
+from env_config import env_flag, env_float, env_int
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+PROFILE_ALL = env_flag("EVERLY_PROFILE")
+PROFILE_MODES = ("sample", "cprofile")
+PROFILE_MODE = os.getenv("EVERLY_PROFILE_MODE", "sample")
+PROFILE_DIR = Path(os.getenv("EVERLY_PROFILE_DIR", PROJECT_ROOT / ".everly_cache" / "profiles"))
+PROFILE_KEEP = env_int("EVERLY_PROFILE_KEEP", 20)
+SAMPLE_INTERVAL = env_float("EVERLY_PROFILE_INTERVAL", 0.005)
+
+T = TypeVar("T")
+
+_FrameKey = tuple[str, int, str]
+
+_active: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("everly_profile", default=None)
+
+# A thread can only have one cProfile profiler enabled at a time.
+_cprofile_threads: set[int] = set()
+_cprofile_lock = threading.Lock()
+
+
+class _Sampler(threading.Thread):
+    """Counts the stacks of the registered threads at a fixed interval."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="everly-profile-sampler", daemon=True)
+        self.interval = interval
+        self.threads: Counter[int] = Counter()
+        self.stacks: Counter[tuple[_FrameKey, ...]] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class _SampledStats:
+    """pstats-compatible statistics derived from stack samples (times are estimates)."""
+
+    def __init__(self, stacks: Counter[tuple[_FrameKey, ...]], interval: float) -> None:
+        self.stacks = stacks
+        self.interval = interval
+        self.stats: dict[_FrameKey, tuple] = {}
+
+    def create_stats(self) -> None:
+        totals: dict[_FrameKey, list] = {}
+        for stack, count in self.stacks.items():
+            seconds = count * self.interval
+            for depth, key in enumerate(stack):
+                entry = totals.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                if key not in stack[:depth]:  # count recursive frames once
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += seconds
+                    if depth == len(stack) - 1:
+                        caller[2] += seconds
+            totals[stack[-1]][2] += seconds
+        self.stats = {
+            key: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in totals.items()
+        }
+
+
+def _frame_label(key: _FrameKey) -> str:
+    filename, line, name = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class Profile:
+    """One profiled request; ``pstats_path`` and ``collapsed_path`` are set once it is written.
+
+    ``cprofile_busy`` is set when another profile had cProfile enabled on a
+    thread this one ran on; that work then only appears in the sampled stacks.
+    """
+
+    def __init__(self, name: str, mode: str = PROFILE_MODE) -> None:
+        self.name = name
+        self.mode = mode if mode in PROFILE_MODES else "sample"
+        self.pstats_path: Optional[Path] = None
+        self.collapsed_path: Optional[Path] = None
+        self._sampler = _Sampler(SAMPLE_INTERVAL)
+        # thread ident -> the cProfile profiler used on that thread
+        self._profilers: dict[int, cProfile.Profile] = {}
+        self.cprofile_busy = False
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _on_this_thread(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            self._sampler.threads[ident] += 1
+        profiler = None
+        if self.mode == "cprofile":
+            with _cprofile_lock:
+                if ident in _cprofile_threads:
+                    self.cprofile_busy = True
+                else:
+                    _cprofile_threads.add(ident)
+                    with self._lock:
+                        profiler = self._profilers.setdefault(ident, cProfile.Profile())
+        try:
+            if profiler is None:
+                yield
+            else:
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    with _cprofile_lock:
+                        _cprofile_threads.discard(ident)
+        finally:
+            with self._lock:
+                self._sampler.threads[ident] -= 1
+                if not self._sampler.threads[ident]:
+                    del self._sampler.threads[ident]
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``func`` on the current thread as part of this profile."""
+        with self._on_this_thread():
+            return func(*args, **kwargs)
+
+    def describe(self) -> str:
+        text = f"Profile written to {self.pstats_path} (collapsed stacks: {self.collapsed_path})"
+        if self.cprofile_busy:
+            text += "; cProfile was busy with another profile on some threads, see the sampled stacks for those"
+        return text
+
+    def write(self) -> None:
+        """Write the profile files; blocking, so keep it off the event loop."""
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name}-{os.getpid()}-{secrets.token_hex(3)}"
+        self.pstats_path = PROFILE_DIR / f"{stem}.pstats"
+        self.collapsed_path = PROFILE_DIR / f"{stem}.collapsed"
+
+        sampled = _SampledStats(self._sampler.stacks, self._sampler.interval)
+        profilers = list(self._profilers.values())
+        if profilers:
+            stats = pstats.Stats(profilers[0])
+            if len(profilers) > 1:
+                stats.add(*profilers[1:])
+        elif self._sampler.stacks:
+            stats = pstats.Stats(sampled)
+        else:  # nothing ran long enough to be sampled
+            stats = pstats.Stats()
+        stats.dump_stats(self.pstats_path)
+
+        with self.collapsed_path.open("w", encoding="utf-8") as handle:
+            for stack, count in sorted(self._sampler.stacks.items(), key=lambda item: -item[1]):
+                handle.write(";".join(_frame_label(key) for key in stack) + f" {count}\n")
+        _rotate()
+
+
+class _Stepped:
+    """Await a coroutine, recording it in a profile only while one of its steps runs."""
+
+    def __init__(self, coro: Coroutine[Any, Any, T], profile: Profile) -> None:
+        self._coro = coro
+        self._profile = profile
+
+    def __await__(self) -> Generator[Any, Any, T]:
+        coro = self._coro
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            with self._profile._on_this_thread():
+                try:
+                    yielded = coro.send(value) if error is None else coro.throw(error)
+                except StopIteration as stop:
+                    return stop.value
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as exc:  # cancellation and errors set on awaited futures
+                value, error = None, exc
+
+
+def _rotate() -> None:
+    """Delete all but the newest ``PROFILE_KEEP`` profiles."""
+    files = sorted(PROFILE_DIR.glob("*.pstats"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for old in files[max(1, PROFILE_KEEP or 1):]:
+        for path in (old, old.with_suffix(".collapsed")):
+            with contextlib.suppress(OSError):
+                path.unlink()
+
+
+@contextlib.contextmanager
+def _activated(profile: Profile) -> Iterator[None]:
+    token = _active.set(profile)
+    profile._sampler.start()
+    try:
+        yield
+    finally:
+        _active.reset(token)
+        profile._sampler.stop()
+
+
+@contextlib.contextmanager
+def profiled(name: str, enabled: bool = False) -> Iterator[Optional[Profile]]:
+    """Profile the block (and work handed off through :func:`run`) when ``enabled`` or ``EVERLY_PROFILE``.
+
+    Yields the :class:`Profile`, whose paths are filled in after the block, or
+    ``None`` when profiling is off. For coroutines use :func:`profiled_call`.
+    """
+    if not (enabled or PROFILE_ALL):
+        yield None
+        return
+
+    profile = Profile(name)
+    try:
+        with _activated(profile), profile._on_this_thread():
+            yield profile
+    finally:
+        profile.write()
+
+
+async def profiled_call(
+    name: str, coro: Coroutine[Any, Any, T], enabled: bool = False
+) -> tuple[T, Optional[Profile]]:
+    """Await ``coro``, profiling its own steps (and work handed off through :func:`run`).
+
+    Returns the result and the :class:`Profile`, or ``None`` when profiling is
+    off. The profile is not written yet: call :meth:`Profile.write` off the
+    event loop. Nothing is written if ``coro`` raises.
+    """
+    if not (enabled or PROFILE_ALL):
+        return await coro, None
+
+    profile = Profile(name)
+    with _activated(profile):
+        result = await _Stepped(coro, profile)
+    return result, profile
+
+
+def current() -> Optional[Profile]:
+    """The profile active in this context, if any."""
+    return _active.get()
+
+
+def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call ``func``, inside the caller's profile if one is active (use on worker threads)."""
+    profile = _active.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    return profile.call(func, *args, **kwargs)
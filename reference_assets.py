@@ -0,0 +1,194 @@
+"""In-memory registry of the reference images under ``train_static/``.
+
+Every file is read once and each image is pre-encoded as ``data:`` URLs at a
+few target sizes and formats; other sizes are encoded at exactly the side
+asked for on first use and kept. Encodings are keyed by content hash, so a
+file that is touched or copied without changing is not re-encoded. Each lookup
+checks the file's mtime and size and swaps in the new content when the file
+changes, so assets can be replaced while the app and MCP server are running.
+Files are read and encoded outside the registry lock, so a slow reload does
+not hold up lookups of other assets.
+Both the MCP server and the LangChain tool read the sample image from here.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from image_encoding import encode_bytes_to_data_url, encode_image_to_data_url
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+ASSET_DIR = PROJECT_ROOT / "train_static"
+SAMPLE_ASSET = "coach_tabTraning.png"
+
+# Longest side in pixels; the original file is always kept as well.
+PREENCODED_SIDES = (1024, 512)
+PREENCODED_FORMATS = ("PNG", "JPEG")
+
+
+class EncodedAsset(NamedTuple):
+    """A data URL plus the pixel size of the image it carries."""
+
+    data_url: str
+    width: int
+    height: int
+
+
+@dataclass
+class ReferenceAsset:
+    """One asset's bytes plus its encodings; ``data`` is the file as stored."""
+
+    content_hash: str
+    data: bytes
+    mime_type: str
+    width: int = 0
+    height: int = 0
+    # (max_side, format) -> encoding; (0, "") is the original file
+    _encoded: dict[tuple[int, str], EncodedAsset] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def is_image(self) -> bool:
+        return self.width > 0
+
+    def encoded(self, max_side: Optional[int] = None, format: str = "PNG") -> EncodedAsset:
+        """The asset as a data URL whose longest side is at most ``max_side``, with its size.
+
+        ``None`` (or a side the image already fits) returns the original file.
+        Other sides are encoded once and kept, so the size sent is always the
+        one asked for.
+        """
+        if max_side is None or not self.is_image or max(self.width, self.height) <= max_side:
+            return self._get((0, ""), self._encode_original)
+        format = format.upper()
+        return self._get((max_side, format), functools.partial(_encode, self.data, max_side, format))
+
+    def data_url(self, max_side: Optional[int] = None, format: str = "PNG") -> str:
+        return self.encoded(max_side, format).data_url
+
+    def _encode_original(self) -> EncodedAsset:
+        return EncodedAsset(encode_bytes_to_data_url(self.data, self.mime_type), self.width, self.height)
+
+    def _get(self, key: tuple[int, str], encode: Callable[[], EncodedAsset]) -> EncodedAsset:
+        with self._lock:
+            encoding = self._encoded.get(key)
+        if encoding is None:
+            # Encode without the lock; a concurrent duplicate is discarded.
+            encoding = encode()
+            with self._lock:
+                encoding = self._encoded.setdefault(key, encoding)
+        return encoding
+
+    def preencode(self) -> None:
+        """Encode an image at the original and ``PREENCODED_SIDES`` sizes; other files stay lazy."""
+        if not self.is_image:
+            return
+        self.encoded()
+        for side in PREENCODED_SIDES:
+            for format in PREENCODED_FORMATS:
+                self.encoded(side, format)
+
+
+def _encode(data: bytes, max_side: int, format: str) -> EncodedAsset:
+    with Image.open(BytesIO(data)) as image:
+        resized = image.convert("RGB") if format == "JPEG" else image.copy()
+    resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    width, height = resized.size
+    return EncodedAsset(encode_image_to_data_url(resized, format=format), width, height)
+
+
+def _load(digest: str, data: bytes) -> ReferenceAsset:
+    try:
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+            mime_type = Image.MIME.get(image.format or "", "application/octet-stream")
+    except UnidentifiedImageError:
+        width, height, mime_type = 0, 0, "application/octet-stream"
+    asset = ReferenceAsset(digest, data, mime_type, width, height)
+    asset.preencode()
+    return asset
+
+
+class ReferenceAssets:
+    """Thread-safe registry of the files in one directory."""
+
+    def __init__(self, directory: Path = ASSET_DIR) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._scanned = False
+        # name -> ((mtime_ns, size), content hash)
+        self._files: dict[str, tuple[tuple[int, int], str]] = {}
+        self._by_hash: dict[str, ReferenceAsset] = {}
+
+    def _refresh(self, name: str) -> Optional[ReferenceAsset]:
+        """Entry for ``name``, reloaded (outside the lock) if the file changed."""
+        path = self.directory / name
+        try:
+            stat = path.stat() if path.is_file() else None
+        except OSError:
+            stat = None
+        signature = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+        with self._lock:
+            known = self._files.get(name)
+            if signature is None:
+                if known is not None:
+                    del self._files[name]
+                    self._release(known[1])
+                return None
+            if known is not None and known[0] == signature:
+                return self._by_hash[known[1]]
+
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            asset = self._by_hash.get(digest)
+        if asset is None:
+            asset = _load(digest, data)
+
+        with self._lock:
+            asset = self._by_hash.setdefault(digest, asset)
+            previous = self._files.get(name)
+            self._files[name] = (signature, digest)
+            if previous is not None and previous[1] != digest:
+                self._release(previous[1])
+        return asset
+
+    def _release(self, digest: str) -> None:
+        """Drop an asset no file refers to any more; call with the lock held."""
+        if all(entry[1] != digest for entry in self._files.values()):
+            self._by_hash.pop(digest, None)
+
+    def _scan(self) -> None:
+        with self._lock:
+            if self._scanned:
+                return
+            self._scanned = True
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file():
+                    self._refresh(path.relative_to(self.directory).as_posix())
+
+    def get(self, name: str) -> Optional[ReferenceAsset]:
+        """The current version of ``name`` (relative to the directory), or ``None`` if missing."""
+        self._scan()
+        return self._refresh(name)
+
+    def names(self) -> list[str]:
+        self._scan()
+        with self._lock:
+            return sorted(self._files)
+
+
+reference_assets = ReferenceAssets()
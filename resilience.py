@@ -0,0 +1,289 @@
+"""Tail-latency hedging and circuit breaking for upstream (OpenAI) calls.
+
+``UpstreamGuard.call`` runs a blocking call with two protections:
+
+* **Hedging** (opt-in): if the call has not returned by the observed latency
+  percentile, a duplicate is fired and whichever finishes first wins. The
+  number of duplicates is capped at a fraction of all calls.
+* **Circuit breaking**: when the recent error rate crosses a threshold the
+  breaker opens and calls fail fast with ``CircuitOpenError`` until a cooldown
+  has passed; one trial call then decides whether it closes again.
+
+Guards keep their state in memory, in the process that makes the calls. In
+the MCP server that state carries across questions only while the server stays
+up (the persistent session or HTTP mode); with ``EVERLY_MCP_PERSISTENT=0`` every
+call spawns a fresh server, so each one starts with an empty latency history
+and a closed breaker.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional, TypeVar
+
+from env_config import env_flag, env_float, env_int
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Sliding-window error-rate breaker with closed, open and half-open states."""
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._times_opened = 0
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` if the call should not go upstream."""
+        with self._lock:
+            if self._state == "open":
+                remaining = self.cooldown - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    self._rejected += 1
+                    failures = self._outcomes.count(False)
+                    raise CircuitOpenError(
+                        f"{self.name} is failing too often ({failures}/{len(self._outcomes)} recent calls "
+                        f"failed), so requests are paused for another {math.ceil(remaining)}s. "
+                        "Please try again shortly."
+                    )
+                self._state = "half_open"
+            if self._state == "half_open":
+                if self._trial_in_flight:
+                    self._rejected += 1
+                    raise CircuitOpenError(f"{self.name} is recovering; a trial request is already in flight.")
+                self._trial_in_flight = True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            self._outcomes.append(success)
+            if self._state == "half_open":
+                self._trial_in_flight = False
+                if success:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                    logger.info("%s circuit closed", self.name)
+                else:
+                    self._open()
+                return
+
+            failures = self._outcomes.count(False)
+            if (
+                self._state == "closed"
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.error_rate
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        logger.warning("%s circuit opened for %.0fs", self.name, self.cooldown)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            return {
+                "state": self._state,
+                "recent_calls": calls,
+                "recent_error_rate": round(failures / calls, 3) if calls else 0.0,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+            }
+
+
+class LatencyHedger:
+    """Fire a duplicate request once the primary exceeds a latency percentile."""
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = False,
+        percentile: float = 95.0,
+        budget: float = 0.1,
+        default_delay: float = 10.0,
+        min_samples: int = 10,
+        window: int = 200,
+        max_workers: int = 8,
+    ) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = budget
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._over_budget = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: the configured latency percentile."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        index = min(len(samples) - 1, math.ceil(self.percentile / 100 * len(samples)) - 1)
+        return samples[max(0, index)]
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _take_hedge_budget(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > max(1.0, self.budget * self._calls):
+                self._over_budget += 1
+                return False
+            self._hedges += 1
+            return True
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix=f"hedge-{self.name}"
+            )
+        return self._executor
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            self._calls += 1
+
+        started = time.monotonic()
+        if not self.enabled:
+            result = func(*args, **kwargs)
+            self._record_latency(time.monotonic() - started)
+            return result
+
+        executor = self._get_executor()
+        primary = executor.submit(func, *args, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self._take_hedge_budget():
+            result = primary.result()
+            self._record_latency(time.monotonic() - started)
+            return result
+
+        logger.info("%s hedging a request after %.2fs", self.name, time.monotonic() - started)
+        hedge = executor.submit(func, *args, **kwargs)
+        winner = self._first_success([primary, hedge])
+        if winner is hedge:
+            with self._lock:
+                self._hedge_wins += 1
+        result = winner.result()
+        self._record_latency(time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _first_success(futures: list[Future]) -> Future:
+        pending = set(futures)
+        finished: Optional[Future] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished = future
+                if future.exception() is None:
+                    return future
+        # Every attempt failed; surface the last error.
+        return finished  # type: ignore[return-value]
+
+    def stats(self) -> dict[str, Any]:
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self._calls,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "skipped_over_budget": self._over_budget,
+                "hedge_delay_s": round(delay, 3),
+                "latency_samples": len(self._latencies),
+            }
+
+
+class UpstreamGuard:
+    """A circuit breaker wrapped around a hedger for one upstream dependency."""
+
+    def __init__(self, name: str, hedger: LatencyHedger, breaker: CircuitBreaker) -> None:
+        self.name = name
+        self.hedger = hedger
+        self.breaker = breaker
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        self.breaker.before_call()
+        try:
+            result = self.hedger.call(func, *args, **kwargs)
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(True)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        return {"hedging": self.hedger.stats(), "circuit_breaker": self.breaker.stats()}
+
+
+_guards: dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_upstream_guard(name: str) -> UpstreamGuard:
+    """Return the process-wide guard for ``name``, configured from ``EVERLY_*`` settings."""
+    with _guards_lock:
+        guard = _guards.get(name)
+        if guard is None:
+            hedger = LatencyHedger(
+                name,
+                enabled=env_flag("EVERLY_HEDGE"),
+                percentile=env_float("EVERLY_HEDGE_PERCENTILE", 95.0),
+                budget=env_float("EVERLY_HEDGE_BUDGET", 0.1),
+                default_delay=env_float("EVERLY_HEDGE_DEFAULT_DELAY", 10.0),
+            )
+            breaker = CircuitBreaker(
+                name,
+                error_rate=env_float("EVERLY_BREAKER_ERROR_RATE", 0.5),
+                window=env_int("EVERLY_BREAKER_WINDOW", 20),
+                min_calls=env_int("EVERLY_BREAKER_MIN_CALLS", 5),
+                cooldown=env_float("EVERLY_BREAKER_COOLDOWN", 30.0),
+            )
+            guard = _guards[name] = UpstreamGuard(name, hedger, breaker)
+        return guard
+
+
+def upstream_stats() -> dict[str, Any]:
+    """Hedge and breaker statistics for every guard used in this process."""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.name: guard.stats() for guard in guards}
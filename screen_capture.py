@@ -0,0 +1,105 @@
+"""Screen capture helpers shared by the MCP server and the legacy LangChain tool."""
+
+from __future__ import annotations
+
+import sys
+from typing import Optional, Sequence
+
+from image_encoding import EncodedFrame, encode_frame
+
+
+CAPTURE_MODES = ("full", "monitor", "window", "region")
+DEFAULT_CAPTURE_MODE = "full"
+
+Region = tuple[int, int, int, int]
+
+
+def _pyautogui():
+    # Imported on first capture: pyautogui needs a display at import time, and
+    # headless callers (batch runs over saved screenshots) never capture.
+    import pyautogui
+
+    return pyautogui
+
+
+def normalize_region(region: Optional[Sequence[int]]) -> Optional[Region]:
+    """Return ``(left, top, width, height)`` as ints, or ``None`` if unusable."""
+    if not region or len(region) != 4:
+        return None
+    left, top, width, height = (int(value) for value in region)
+    if width <= 0 or height <= 0:
+        return None
+    return left, top, width, height
+
+
+def active_window_region() -> Optional[Region]:
+    """Return the geometry of the foreground window, or ``None`` if unknown.
+
+    pyautogui only exposes window geometry where pygetwindow is supported
+    (Windows); elsewhere the capture falls back to the full screen. Other
+    platforms skip the import, since the UI polls this while in window mode.
+    """
+    if sys.platform != "win32":
+        return None
+    get_active_window = getattr(_pyautogui(), "getActiveWindow", None)
+    if get_active_window is None:
+        return None
+    try:
+        window = get_active_window()
+    except Exception:  # pragma: no cover - platform specific
+        return None
+    if window is None:
+        return None
+    return normalize_region((window.left, window.top, window.width, window.height))
+
+
+def resolve_capture_region(mode: str, region: Optional[Sequence[int]] = None) -> Optional[Region]:
+    """Translate a capture mode into a screen region, ``None`` meaning the full screen.
+
+    ``monitor`` and ``region`` expect the caller (the UI) to pass the geometry,
+    since only the UI knows where the floating bar lives and what the user drew.
+    ``window`` uses the caller's geometry when given: once the user types into
+    the floating bar, the foreground window is Everly's own.
+    """
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"Unknown capture mode '{mode}'. Expected one of: {', '.join(CAPTURE_MODES)}.")
+
+    if mode == "window":
+        return normalize_region(region) or active_window_region()
+    if mode in ("monitor", "region"):
+        return normalize_region(region)
+    return None
+
+
+def capture_screen(mode: str = DEFAULT_CAPTURE_MODE, region: Optional[Sequence[int]] = None):
+    """Capture the screen according to ``mode`` and return a PIL image."""
+    resolved = resolve_capture_region(mode, region)
+    if resolved is None:
+        return _pyautogui().screenshot()
+    return _pyautogui().screenshot(region=resolved)
+
+
+def capture_encoded_frame(
+    mode: str = DEFAULT_CAPTURE_MODE,
+    region: Optional[Sequence[int]] = None,
+    max_side: Optional[int] = None,
+) -> EncodedFrame:
+    """Capture, optionally downscale, hash and encode the screen as a PNG data URL.
+
+    Runs as one unit so it can be shipped to a process pool: only the encoded
+    string and its hash cross the process boundary, never the raw frame.
+    """
+    image = capture_screen(mode, region)
+    image = downscale(image, max_side)
+    return encode_frame(image)
+
+
+def downscale(image, max_side: Optional[int]):
+    """Shrink ``image`` so its longest side is at most ``max_side`` pixels."""
+    if not max_side or max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    resized = image.resize(size)
+    image.close()
+    return resized
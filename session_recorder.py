@@ -0,0 +1,175 @@
+"""Record Everly sessions for ``session_replay.py``.
+
+Recording is opt-in: with ``EVERLY_RECORD_DIR`` set, the MCP client appends
+one line per tool call (session, arguments, start time, latency) to
+``events.jsonl`` in that directory and tags the request ``_meta`` with a call
+ID. The MCP server, given the same setting, adds the frame each call looked at
+(the already compressed upload image, stored once per SHA-256 of its bytes
+under ``frames/``) and the latency, tokens and status of every upstream
+request it made for that call.
+
+The client, the server and the usage ledger all import this module, so it
+imports nothing else from the project: the hot reloader restarts whichever
+process imports a file, and the UI and server must stay separate.
+"""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Mapping, Optional
+
+
+RECORD_DIR = os.getenv("EVERLY_RECORD_DIR")
+
+CALL_META_KEY = "everly_call"
+EVENTS_FILE = "events.jsonl"
+FRAMES_DIR = "frames"
+
+_current_call: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("everly_call", default=None)
+
+
+class SessionRecorder:
+    """Appends session events to ``events.jsonl``, one ``write`` per line, from any process."""
+
+    def __init__(self, directory: Optional[Path]) -> None:
+        self.directory = directory
+        self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    @property
+    def recording(self) -> bool:
+        """True inside a call that a recording client tagged."""
+        return self.enabled and _current_call.get() is not None
+
+    def _emit(self, event: dict[str, Any]) -> None:
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.directory / EVENTS_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            os.write(self._fd, line)
+
+    @contextlib.contextmanager
+    def call(self, tool: str, arguments: Mapping[str, Any]) -> Iterator[None]:
+        """Client side: record one tool call and tag requests made inside it."""
+        if not self.enabled:
+            yield
+            return
+        call_id = secrets.token_hex(8)
+        token = _current_call.set(call_id)
+        started = time.time()
+        status = "ok"
+        try:
+            yield
+        except BaseException as exc:
+            status = type(exc).__name__
+            raise
+        finally:
+            _current_call.reset(token)
+            self._emit({
+                "type": "call",
+                "session": self.session,
+                "call": call_id,
+                "tool": tool,
+                # Frame handles point at shared memory that is gone; the server records the frame.
+                "args": {key: value for key, value in arguments.items() if key != "frame"},
+                "start": started,
+                "latency_s": round(time.time() - started, 4),
+                "status": status,
+            })
+
+    @contextlib.contextmanager
+    def serving(self, meta: Any) -> Iterator[None]:
+        """Server side: attribute frames and upstream requests to the caller's call ID."""
+        call_id = extract_meta(meta) if self.enabled else None
+        if call_id is None:
+            yield
+            return
+        token = _current_call.set(call_id)
+        try:
+            yield
+        finally:
+            _current_call.reset(token)
+
+    def frame(self, screenshot: Any) -> None:
+        """Store an ``EncodedFrame`` (once per content) and link it to the current call.
+
+        Files are named by the SHA-256 of the image bytes, so two different
+        frames never share a file.
+        """
+        if not self.recording:
+            return
+        header, _, payload = screenshot.data_url.partition(",")
+        extension = header.split("/", 1)[-1].split(";", 1)[0] or "png"
+        data = base64.b64decode(payload)
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{FRAMES_DIR}/{digest}.{extension}"
+        path = self.directory / name
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_suffix(f".{os.getpid()}.tmp")
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+        self._emit({
+            "type": "frame",
+            "call": _current_call.get(),
+            "hash": digest,
+            "file": name,
+            "width": screenshot.width,
+            "height": screenshot.height,
+        })
+
+    def upstream(
+        self,
+        tool: str,
+        model: Optional[str],
+        latency_s: float,
+        input_tokens: int,
+        output_tokens: int,
+        status: str,
+    ) -> None:
+        """Record one upstream request made for the current call."""
+        if not self.recording:
+            return
+        self._emit({
+            "type": "upstream",
+            "call": _current_call.get(),
+            "tool": tool,
+            "model": model,
+            "latency_s": round(latency_s, 4),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "status": status,
+        })
+
+    def inject_meta(self) -> Optional[dict[str, str]]:
+        """Request ``_meta`` carrying the current call ID, or ``None`` when not recording."""
+        call_id = _current_call.get() if self.enabled else None
+        return {CALL_META_KEY: call_id} if call_id is not None else None
+
+
+def extract_meta(meta: Any) -> Optional[str]:
+    """Call ID from a request ``_meta`` (a mapping or a pydantic model with extras)."""
+    if meta is None:
+        return None
+    if not isinstance(meta, Mapping):
+        meta = getattr(meta, "model_extra", None) or {}
+    value = meta.get(CALL_META_KEY)
+    return value if isinstance(value, str) else None
+
+
+recorder = SessionRecorder(Path(RECORD_DIR) if RECORD_DIR else None)
@@ -0,0 +1,470 @@
+"""Replay recorded Everly sessions as a load test.
+
+Recording is done by ``session_recorder`` inside the client and server (set
+``EVERLY_RECORD_DIR``); this module only reads recordings. The runtime modules
+never import it, so its imports stay out of the UI's and server's reload
+closures.
+
+Replay starts local stand-ins for OpenAI and the Make.com webhooks that answer
+with latencies drawn from the recording, runs an MCP server against them over
+HTTP and replays every recorded session closed-loop: each call is sent after
+the recorded think time (from the previous answer to the next question)
+divided by ``--speed``. ``--copies`` runs that many users per session at once.
+The report has latency percentiles per tool plus CPU time and peak memory of
+the server.
+
+Usage:
+    python session_replay.py replay DIR [--speed 1] [--copies 1] [--max-pause 300] [--json PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from session_recorder import EVENTS_FILE
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+# Tools the replayer knows how to drive.
+REPLAYED_TOOLS = ("screenshot_analysis", "extract_training_calendar", "schedule_workout", "send_message_to_client")
+
+
+@dataclass
+class RecordedCall:
+    session: str
+    call: str
+    tool: str
+    args: dict[str, Any]
+    start: float
+    latency_s: float
+    frame: Optional[Path] = None
+    upstream: list[dict[str, Any]] = field(default_factory=list)
+
+
+def load_recording(directory: Path) -> dict[str, list[RecordedCall]]:
+    """Recorded calls per session, in the order they were made."""
+    calls: dict[str, RecordedCall] = {}
+    frames: dict[str, Path] = {}
+    upstream: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    with (directory / EVENTS_FILE).open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            kind = event.get("type")
+            if kind == "call":
+                calls[event["call"]] = RecordedCall(
+                    event["session"], event["call"], event["tool"], event.get("args", {}),
+                    event["start"], event.get("latency_s", 0.0),
+                )
+            elif kind == "frame":
+                frames[event["call"]] = directory / event["file"]
+            elif kind == "upstream":
+                upstream[event["call"]].append(event)
+
+    sessions: dict[str, list[RecordedCall]] = defaultdict(list)
+    for call in calls.values():
+        call.frame = frames.get(call.call)
+        call.upstream = upstream.get(call.call, [])
+        sessions[call.session].append(call)
+    for session_calls in sessions.values():
+        session_calls.sort(key=lambda call: call.start)
+    return dict(sessions)
+
+
+class _StandInUpstreams(ThreadingHTTPServer):
+    """Local OpenAI Responses API and webhook stand-ins answering with recorded latencies.
+
+    OpenAI requests draw a recorded request for the same model; webhook
+    requests (``/hook/<tool>``) one for the same tool. Recorded failures are
+    answered with an HTTP error.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, sessions: dict[str, list[RecordedCall]], seed: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.samples: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        for calls in sessions.values():
+            for call in calls:
+                for event in call.upstream:
+                    self.samples[event["model"] or event["tool"]].append(event)
+                    if event["model"]:
+                        self.samples["openai"].append(event)
+        self.requests: dict[str, int] = defaultdict(int)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def sample(self, key: str, fallback: str) -> dict[str, Any]:
+        with self._lock:
+            self.requests[fallback] += 1
+            candidates = self.samples.get(key) or self.samples.get(fallback)
+            if not candidates:
+                return {"latency_s": 1.0, "output_tokens": 200, "input_tokens": 1000, "status": "ok"}
+            return self._random.choice(candidates)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: _StandInUpstreams
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path.startswith("/hook/"):
+            sample = self.server.sample(self.path.rsplit("/", 1)[-1], "webhook")
+        elif self.path.endswith("/responses"):
+            sample = self.server.sample(request.get("model") or "", "openai")
+        else:
+            self._reply(404, {"error": {"message": f"no stand-in for {self.path}"}})
+            return
+
+        time.sleep(sample["latency_s"])
+        status = sample.get("status", "ok")
+        if status != "ok":
+            code = int(status[5:]) if status.startswith("http_") and status[5:].isdigit() else 500
+            self._reply(code, {"error": {"message": f"replayed upstream failure ({status})"}})
+        elif self.path.startswith("/hook/"):
+            self._reply(200, {"accepted": True})
+        else:
+            self._reply(200, _response_body(request, sample))
+
+
+def _response_body(request: dict[str, Any], sample: dict[str, Any]) -> dict[str, Any]:
+    output_tokens = int(sample.get("output_tokens") or 0)
+    if ((request.get("text") or {}).get("format") or {}).get("type") == "json_object":
+        text = '{"weeks": []}'
+    else:
+        # About four characters per token, so answers are as long as the recorded ones.
+        text = ("Replayed answer. " * (output_tokens // 4 + 1)).strip()
+    input_tokens = int(sample.get("input_tokens") or 0)
+    return {
+        "id": f"resp_{secrets.token_hex(8)}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": request.get("model"),
+        "status": "completed",
+        "output": [{
+            "id": f"msg_{secrets.token_hex(8)}",
+            "type": "message",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(stand_ins: _StandInUpstreams, scratch: Path, timeout: float = 30.0) -> tuple[subprocess.Popen, str]:
+    """Run ``mcp_server.py`` over HTTP against the stand-ins, with its caches in ``scratch``."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("EVERLY_RECORD_DIR", None)
+    env.update({
+        "OPENAI_API_KEY": "session-replay",
+        "OPENAI_BASE_URL": f"{stand_ins.url}/v1",
+        "EVERLY_SCHEDULE_WEBHOOK_URL": f"{stand_ins.url}/hook/schedule_workout",
+        "EVERLY_MESSAGE_WEBHOOK_URL": f"{stand_ins.url}/hook/send_message_to_client",
+        "EVERLY_USAGE_DB": str(scratch / "usage.sqlite3"),
+        "EVERLY_HISTORY_DB": str(scratch / "history.sqlite3"),
+        "EVERLY_LAYOUT_CACHE_DIR": str(scratch / "layout_specs"),
+        "EVERLY_CALENDAR_CACHE_DIR": str(scratch / "calendars"),
+    })
+    process = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "mcp_server.py"), "--transport", "streamable-http",
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # Its own process group, so a server that will not stop is killed with its workers.
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"MCP server exited with status {process.returncode} during start-up")
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.2):
+            return process, f"http://127.0.0.1:{port}/mcp"
+        time.sleep(0.1)
+    _stop_server(process, timeout=5)
+    raise RuntimeError("MCP server did not start listening in time")
+
+
+def _stop_server(process: subprocess.Popen, timeout: float = 30.0) -> None:
+    """Stop the server gracefully so it reaps its pool workers before exiting.
+
+    The server shuts its pools down and waits for them on SIGTERM, so their
+    CPU time ends up in ``RUSAGE_CHILDREN`` and no worker outlives the run.
+    Killing is the fallback, and takes the whole process group with it.
+    """
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+        return
+    except subprocess.TimeoutExpired:
+        pass
+    if hasattr(os, "killpg"):
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+    else:  # pragma: no cover - Windows
+        process.kill()
+    process.wait()
+
+
+class _Replayer:
+    def __init__(self, agent: Any, speed: float, max_pause: float, distinct_copies: bool) -> None:
+        self.agent = agent
+        self.speed = speed
+        self.max_pause = max_pause
+        self.distinct_copies = distinct_copies
+        self.results: list[tuple[str, float, str]] = []
+        self._frames: dict[Path, Any] = {}
+        self._lock = threading.Lock()
+
+    def _image(self, path: Path) -> Any:
+        from PIL import Image
+
+        with self._lock:
+            image = self._frames.get(path)
+            if image is None:
+                with Image.open(path) as opened:
+                    image = self._frames[path] = opened.convert("RGB")
+            return image
+
+    def _send(self, call: RecordedCall, copy: int) -> Optional[str]:
+        question = call.args.get("question", "")
+        message = call.args.get("message", "")
+        if self.distinct_copies and copy:
+            # Otherwise the server would coalesce the copies' identical calls into one.
+            question, message = f"{question} (copy {copy})", f"{message} (copy {copy})"
+        if call.tool == "schedule_workout":
+            return self.agent.schedule_workout(call.args.get("date", ""))
+        if call.tool == "send_message_to_client":
+            return self.agent.send_message_to_client(message)
+        if call.frame is None or not call.frame.exists():
+            return None
+        image = self._image(call.frame)
+        if call.tool == "extract_training_calendar":
+            return self.agent.extract_training_calendar_from_frame(image)
+        return self.agent.analyze_frame_with_question(question, image)
+
+    def run_session(self, calls: list[RecordedCall], copy: int) -> None:
+        from batch import ERROR_PREFIXES
+
+        previous_end: Optional[float] = None
+        for call in calls:
+            if call.tool not in REPLAYED_TOOLS:
+                continue
+            if previous_end is not None:
+                think = min(max(0.0, call.start - previous_end), self.max_pause)
+                time.sleep(think / self.speed)
+            previous_end = call.start + call.latency_s
+
+            started = time.perf_counter()
+            answer = self._send(call, copy)
+            latency = time.perf_counter() - started
+            if answer is None:
+                status = "skipped"
+            else:
+                status = "error" if answer.startswith(ERROR_PREFIXES) else "ok"
+            with self._lock:
+                self.results.append((call.tool, latency, status))
+
+
+def _cpu_seconds(usage: Any) -> float:
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb(usage: Any) -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def replay(
+    directory: Path,
+    speed: float = 1.0,
+    copies: int = 1,
+    max_pause: float = 300.0,
+    distinct_copies: bool = True,
+) -> dict[str, Any]:
+    """Replay a recording against stand-in upstreams and return the report."""
+    from batch import percentile
+
+    sessions = load_recording(directory)
+    if not sessions:
+        raise ValueError(f"{directory / EVENTS_FILE} has no recorded calls")
+
+    stand_ins = _StandInUpstreams(sessions)
+    threading.Thread(target=stand_ins.serve_forever, name="stand-in-upstreams", daemon=True).start()
+    with tempfile.TemporaryDirectory(prefix="everly-replay-") as scratch:
+        process, url = _start_server(stand_ins, Path(scratch))
+        # The client reads these at import; this process must not record its own replay.
+        os.environ["EVERLY_MCP_URL"] = url
+        os.environ.pop("EVERLY_RECORD_DIR", None)
+        from mcp_client import EverlyAgent
+
+        agent = EverlyAgent()
+        agent.warm_up()
+        replayer = _Replayer(agent, speed, max_pause, distinct_copies)
+        self_before = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        started = time.perf_counter()
+        try:
+            threads = [
+                threading.Thread(target=replayer.run_session, args=(calls, copy), name=f"replay-{copy}")
+                for calls in sessions.values()
+                for copy in range(copies)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            wall = time.perf_counter() - started
+            agent.close()
+            _stop_server(process)
+            stand_ins.shutdown()
+
+    recorded: dict[str, list[float]] = defaultdict(list)
+    for calls in sessions.values():
+        for call in calls:
+            recorded[call.tool].append(call.latency_s)
+    tools: dict[str, Any] = {}
+    for tool in sorted({tool for tool, _, _ in replayer.results}):
+        latencies = [latency for name, latency, status in replayer.results if name == tool and status != "skipped"]
+        row: dict[str, Any] = {
+            "calls": len(latencies),
+            "errors": sum(1 for name, _, status in replayer.results if name == tool and status == "error"),
+            "skipped": sum(1 for name, _, status in replayer.results if name == tool and status == "skipped"),
+        }
+        if latencies:
+            for rank in (50, 95, 99):
+                row[f"p{rank}_s"] = round(percentile(latencies, rank), 3)
+            row["max_s"] = round(max(latencies), 3)
+        if recorded[tool]:
+            row["recorded_p50_s"] = round(percentile(recorded[tool], 50), 3)
+        tools[tool] = row
+
+    calls_made = sum(row["calls"] for row in tools.values())
+    report: dict[str, Any] = {
+        "sessions": len(sessions),
+        "copies": copies,
+        "speed": speed,
+        "calls": calls_made,
+        "wall_s": round(wall, 3),
+        "calls_per_s": round(calls_made / wall, 2) if wall else 0.0,
+        "tools": tools,
+        "stand_in_requests": dict(stand_ins.requests),
+    }
+    if resource is not None:
+        # The server has exited, so its usage (and its reaped workers') is in RUSAGE_CHILDREN.
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        report["server_cpu_s"] = round(_cpu_seconds(children), 2)
+        report["server_peak_rss_mb"] = round(_peak_rss_mb(children), 1)
+        report["replayer_cpu_s"] = round(_cpu_seconds(self_after) - _cpu_seconds(self_before), 2)
+    return report
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    print(
+        f"Replayed {report['sessions']} session(s) x {report['copies']} at {report['speed']:g}x: "
+        f"{report['calls']} calls in {report['wall_s']:.1f} s ({report['calls_per_s']:.2f} calls/s)"
+    )
+    print(f"{'tool':<28}{'calls':>7}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}{'recorded p50':>14}")
+    for tool, row in report["tools"].items():
+        cells = "".join(f"{row[key]:>9.2f}" if key in row else f"{'-':>9}" for key in ("p50_s", "p95_s", "p99_s", "max_s"))
+        recorded = f"{row['recorded_p50_s']:>14.2f}" if "recorded_p50_s" in row else f"{'-':>14}"
+        print(f"{tool:<28}{row['calls']:>7}{row['errors']:>8}{cells}{recorded}")
+        if row["skipped"]:
+            print(f"  ({row['skipped']} call(s) skipped: no recorded frame)")
+    if "server_cpu_s" in report:
+        print(
+            f"Server: {report['server_cpu_s']:.1f} s CPU, peak RSS {report['server_peak_rss_mb']:.0f} MB; "
+            f"replayer and stand-ins: {report['replayer_cpu_s']:.1f} s CPU"
+        )
+    requests = ", ".join(f"{name} {count}" for name, count in sorted(report["stand_in_requests"].items()))
+    print(f"Stand-in upstream requests: {requests or 'none'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Everly session recording and replay")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subcommands.add_parser("replay", help="replay a recording against stand-in upstreams")
+    replay_parser.add_argument("directory", type=Path, help="an EVERLY_RECORD_DIR recording")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="divide think times by this factor")
+    replay_parser.add_argument("--copies", type=int, default=1, help="parallel users per recorded session")
+    replay_parser.add_argument("--max-pause", type=float, default=300.0, help="cap recorded think times (seconds)")
+    replay_parser.add_argument(
+        "--share-duplicates",
+        action="store_true",
+        help="send every copy's questions and messages unchanged, so the server coalesces them",
+    )
+    replay_parser.add_argument("--json", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    if not (args.directory / EVENTS_FILE).exists():
+        parser.exit(1, f"No recording in {args.directory} ({EVENTS_FILE} is missing).\n")
+    try:
+        report = replay(args.directory, args.speed, max(1, args.copies), args.max_pause, not args.share_duplicates)
+    except (RuntimeError, ValueError) as exc:
+        parser.exit(1, f"{exc}\n")
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Cross-process request tracing exported in Chrome trace-event format.
+
+A question gets a trace ID in the UI; ``mcp_client`` forwards the current
+span to the MCP server as a W3C ``traceparent`` in the request ``_meta``, and
+the server continues the trace. Every process appends complete ("X") events
+to the same file, plus flow events linking each client call to its server
+tool span. Open the file in ``chrome://tracing`` or https://ui.perfetto.dev
+to see one request as a flame chart.
+
+Enable with ``EVERLY_TRACE=1``; events go to ``EVERLY_TRACE_FILE``
+(default ``.everly_cache/trace.json``). Delete the file to start afresh.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Mapping, NamedTuple, Optional
+
+from env_config import env_flag
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+TRACE_ENABLED = env_flag("EVERLY_TRACE")
+TRACE_PATH = Path(os.getenv("EVERLY_TRACE_FILE", PROJECT_ROOT / ".everly_cache" / "trace.json"))
+
+TRACEPARENT_KEY = "traceparent"
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @classmethod
+    def from_traceparent(cls, value: str) -> Optional["SpanContext"]:
+        parts = value.split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            int(parts[1], 16), int(parts[2], 16)
+        except ValueError:
+            return None
+        return cls(parts[1], parts[2])
+
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("everly_span", default=None)
+
+
+class _TraceWriter:
+    """Appends events to the shared trace file, one ``write`` per event.
+
+    The file uses the JSON array format with the closing bracket omitted, which
+    the trace viewers accept; appends from several processes never rewrite it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.process_name = Path(sys.argv[0]).stem or "python"
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> int:
+        if self._fd is not None and self._pid == os.getpid():
+            return self._fd
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            header = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            pass
+        else:
+            os.write(header, b"[\n")
+            os.close(header)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._pid = os.getpid()
+        self._write(self._fd, {
+            "name": "process_name",
+            "ph": "M",
+            "pid": self._pid,
+            "args": {"name": f"{self.process_name} ({self._pid})"},
+        })
+        return self._fd
+
+    @staticmethod
+    def _write(fd: int, event: dict[str, Any]) -> None:
+        os.write(fd, (json.dumps(event, separators=(",", ":"), default=str) + ",\n").encode("utf-8"))
+
+    def emit(self, event: dict[str, Any]) -> None:
+        with self._lock:
+            fd = self._open()
+            event.setdefault("pid", self._pid)
+            event.setdefault("tid", threading.get_native_id())
+            self._write(fd, event)
+
+
+_writer = _TraceWriter(TRACE_PATH)
+
+
+def set_process_name(name: str) -> None:
+    """Label this process in the trace viewer; call before the first span."""
+    _writer.process_name = name
+
+
+def current_span() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def _now_us() -> float:
+    # Wall-clock microseconds so events from different processes line up.
+    return time.time_ns() / 1000
+
+
+@contextlib.contextmanager
+def span(
+    name: str,
+    cat: str = "everly",
+    parent: Optional[SpanContext] = None,
+    flow_in: bool = False,
+    flow_out: bool = False,
+    **args: Any,
+) -> Iterator[Optional[SpanContext]]:
+    """Record ``name`` as a complete event in the current (or ``parent``'s) trace.
+
+    ``flow_out`` starts a flow arrow from this span that a remote span opened
+    with ``flow_in`` and this span as ``parent`` finishes. Yields ``None`` when
+    tracing is off.
+    """
+    if not TRACE_ENABLED:
+        yield None
+        return
+
+    parent = parent if parent is not None else _current.get()
+    context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+    token = _current.set(context)
+    started = _now_us()
+    if flow_out:
+        _writer.emit({"name": "mcp", "cat": "flow", "ph": "s", "id": context.span_id, "ts": started})
+    if flow_in and parent is not None:
+        _writer.emit({"name": "mcp", "cat": "flow", "ph": "f", "bp": "e", "id": parent.span_id, "ts": started})
+    status = "ok"
+    try:
+        yield context
+    except BaseException as exc:
+        status = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        finished = _now_us()
+        _writer.emit({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": started,
+            "dur": finished - started,
+            "args": {
+                "trace_id": context.trace_id,
+                "span_id": context.span_id,
+                "parent_id": parent.span_id if parent else None,
+                "status": status,
+                **args,
+            },
+        })
+
+
+def inject_meta() -> Optional[dict[str, str]]:
+    """Request ``_meta`` carrying the current span, or ``None`` outside a trace."""
+    context = _current.get()
+    return {TRACEPARENT_KEY: context.traceparent} if context is not None else None
+
+
+def extract_meta(meta: Any) -> Optional[SpanContext]:
+    """Parent span from a request ``_meta`` (a mapping or a pydantic model with extras)."""
+    if meta is None:
+        return None
+    if not isinstance(meta, Mapping):
+        meta = getattr(meta, "model_extra", None) or {}
+    value = meta.get(TRACEPARENT_KEY)
+    return SpanContext.from_traceparent(value) if isinstance(value, str) else None
@@ -0,0 +1,471 @@
+"""Structured extraction of the Everfit two-week training calendar.
+
+The first calendar question about a screen pays for one vision call that turns
+the 2x7 grid of day cells into JSON; the result is cached under the SHA-256 of
+the encoded screenshot (in memory and on disk, for ``EVERLY_CALENDAR_CACHE_TTL``
+seconds). Only questions that mention workouts, sessions, training, exercises,
+sets, a week or empty/rest days are treated as calendar questions, and
+superlatives ("the hardest workout") are left to the vision model. "This week"
+and "next week" are resolved against the dates in the calendar. Follow-up counts and lookups ("how many workouts this
+week?", "which days are empty?", "what day is the leg workout?") are then
+answered locally from that JSON, without another round trip.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+from openai import OpenAI
+
+import tracing
+from env_config import env_flag, env_int
+from image_encoding import EncodedFrame
+from model_router import model_cost
+from resilience import get_upstream_guard
+from usage_ledger import estimate_image_tokens, ledger
+
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+CALENDAR_CACHE_DIR = Path(os.getenv("EVERLY_CALENDAR_CACHE_DIR", PROJECT_ROOT / ".everly_cache" / "calendars"))
+
+LOCAL_CALENDAR_ANSWERS = env_flag("EVERLY_LOCAL_CALENDAR_ANSWERS", True)
+CALENDAR_MODEL = os.getenv("EVERLY_CALENDAR_MODEL", "gpt-4o")
+_MEMORY_CACHE_SIZE = env_int("EVERLY_CALENDAR_CACHE_SIZE", 32)
+CALENDAR_CACHE_TTL = env_int("EVERLY_CALENDAR_CACHE_TTL", 7 * 24 * 3600)
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_EXTRACTION_PROMPT = (
+    "This screenshot should show the Everfit coaching platform's 'Training' tab in '2-Week view': "
+    "2 rows (week 1 and week 2) of 7 day cells (Monday to Sunday); each white box in a cell is a workout card. "
+    "Extract the calendar as JSON exactly in this shape:\n"
+    '{"is_calendar": true, "weeks": [{"week": 1, "days": [{"day": "Monday", "date": "Oct 20", '
+    '"workouts": [{"title": "Leg Day", "completed": false, "exercises": [{"name": "Back Squat", '
+    '"sets": 4, "reps": "8", "intensity": "RPE 7"}]}]}]}]}\n'
+    "Include all 7 days of both weeks, with an empty workouts list for empty days. Use null for any value "
+    "that is not visible; never guess. If the screen does not show this calendar, return "
+    '{"is_calendar": false, "weeks": []}.'
+)
+
+
+class CalendarExtractionError(RuntimeError):
+    """The calendar could not be read (no API key, empty or malformed reply); nothing is cached."""
+
+
+def _normalize_sets(value: Any) -> Any:
+    """Sets as an int when the model gave a whole number, else its text ("3-4") or ``None``."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if float(value).is_integer() else str(value)
+    text = str(value).strip()
+    match = re.fullmatch(r"(\d+)(?:\s*sets?)?", text, re.IGNORECASE)
+    if match:
+        return int(match.group(1))
+    return text or None
+
+
+def _normalize_calendar(raw: dict[str, Any]) -> Optional[dict[str, Any]]:
+    if not raw.get("is_calendar") or not raw.get("weeks"):
+        return None
+    weeks = []
+    for week_index, week in enumerate(raw["weeks"], start=1):
+        days = []
+        for day in week.get("days") or []:
+            workouts = []
+            for workout in day.get("workouts") or []:
+                workouts.append(
+                    {
+                        "title": workout.get("title") or "",
+                        "completed": bool(workout.get("completed")),
+                        "exercises": [
+                            {
+                                "name": exercise.get("name") or "",
+                                "sets": _normalize_sets(exercise.get("sets")),
+                                "reps": exercise.get("reps"),
+                                "intensity": exercise.get("intensity"),
+                            }
+                            for exercise in workout.get("exercises") or []
+                        ],
+                    }
+                )
+            days.append({"day": str(day.get("day") or ""), "date": day.get("date"), "workouts": workouts})
+        weeks.append({"week": int(week.get("week") or week_index), "days": days})
+    return {"weeks": weeks}
+
+
+def extract_calendar(screenshot_url: str, image_tokens: int = 0) -> Optional[dict[str, Any]]:
+    """Ask the vision model for the calendar JSON; ``None`` if the model says it is not a calendar.
+
+    Raises :class:`CalendarExtractionError` (or the upstream error) when no
+    answer could be had, so that failures are not cached as "not a calendar".
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise CalendarExtractionError("OpenAI API key is not configured. Please set OPENAI_API_KEY.")
+
+    client = OpenAI(api_key=api_key)
+    started = time.perf_counter()
+    with tracing.span("openai.extract_calendar", cat="upstream", model=CALENDAR_MODEL):
+        response = get_upstream_guard("OpenAI").call(
+            client.responses.create,
+            model=CALENDAR_MODEL,
+            temperature=0,
+            input=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": _EXTRACTION_PROMPT},
+                        {"type": "input_image", "image_url": screenshot_url},
+                    ],
+                }
+            ],
+            text={"format": {"type": "json_object"}},
+            max_output_tokens=4000,
+        )
+    usage = getattr(response, "usage", None)
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    ledger.record(
+        "extract_training_calendar",
+        CALENDAR_MODEL,
+        time.perf_counter() - started,
+        input_tokens,
+        output_tokens,
+        image_tokens,
+        model_cost(CALENDAR_MODEL, input_tokens, output_tokens),
+    )
+    text = (getattr(response, "output_text", None) or "").strip()
+    if not text:
+        raise CalendarExtractionError("The model returned no calendar.")
+    try:
+        raw = json.loads(text)
+    except ValueError as exc:
+        raise CalendarExtractionError("The model returned malformed calendar JSON.") from exc
+    if raw.get("is_calendar") is False:
+        return None
+    calendar = _normalize_calendar(raw)
+    if calendar is None:
+        raise CalendarExtractionError("The model returned a calendar without any weeks.")
+    return calendar
+
+
+class CalendarCache:
+    """Calendars keyed by content hash: a small in-memory LRU backed by JSON files.
+
+    Entries older than ``ttl`` seconds are ignored and their files deleted, so
+    a cache directory shared across runs neither grows nor serves stale data
+    forever.
+    """
+
+    def __init__(
+        self, directory: Path = CALENDAR_CACHE_DIR, size: int = _MEMORY_CACHE_SIZE, ttl: float = CALENDAR_CACHE_TTL
+    ) -> None:
+        self.directory = directory
+        self.size = size
+        self.ttl = ttl
+        # content hash -> (stored at, calendar)
+        self._memory: OrderedDict[str, tuple[float, Optional[dict[str, Any]]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._extracting: dict[str, threading.Lock] = {}
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _remember(self, content_hash: str, calendar: Optional[dict[str, Any]], stored_at: float) -> None:
+        with self._lock:
+            self._memory[content_hash] = (stored_at, calendar)
+            self._memory.move_to_end(content_hash)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def lookup(self, content_hash: str) -> tuple[bool, Optional[dict[str, Any]]]:
+        """Return ``(found, calendar)``; a found ``None`` means "not a calendar screen"."""
+        with self._lock:
+            entry = self._memory.get(content_hash)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(content_hash)
+                    return True, entry[1]
+                del self._memory[content_hash]
+        path = self.directory / f"{content_hash}.json"
+        try:
+            stored_at = path.stat().st_mtime
+            if self._expired(stored_at):
+                path.unlink()
+                return False, None
+            calendar = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False, None
+        self._remember(content_hash, calendar, stored_at)
+        return True, calendar
+
+    def prune(self) -> None:
+        """Delete expired calendar files."""
+        if self.ttl <= 0 or not self.directory.is_dir():
+            return
+        for path in self.directory.glob("*.json"):
+            try:
+                if self._expired(path.stat().st_mtime):
+                    path.unlink()
+            except OSError:
+                continue
+
+    def get_or_extract(self, screenshot: EncodedFrame) -> Optional[dict[str, Any]]:
+        key = screenshot.content_hash
+        found, calendar = self.lookup(key)
+        if found:
+            return calendar
+
+        # One extraction per distinct screen, even under concurrent questions.
+        with self._lock:
+            extraction_lock = self._extracting.setdefault(key, threading.Lock())
+        with extraction_lock:
+            found, calendar = self.lookup(key)
+            if found:
+                return calendar
+            try:
+                # Errors propagate uncached; only an explicit "not a calendar" is remembered.
+                calendar = extract_calendar(
+                    screenshot.data_url, estimate_image_tokens(screenshot.width, screenshot.height)
+                )
+            finally:
+                with self._lock:
+                    self._extracting.pop(key, None)
+
+            self.prune()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{key}.json"
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(calendar), encoding="utf-8")
+            os.replace(temporary, path)
+            self._remember(key, calendar, time.time())
+            return calendar
+
+
+calendar_cache = CalendarCache()
+
+
+# ===== Local answering =====
+
+@dataclass(frozen=True)
+class CalendarQuestion:
+    intent: str
+    week: Optional[int] = None
+    day: Optional[str] = None
+    subject: Optional[str] = None
+    # "this" or "next": resolved to a week row from the calendar's dates when answering.
+    relative_week: Optional[str] = None
+
+
+_DAY_PATTERN = re.compile(
+    r"\b(mon|tue|wed|thu|fri|sat|sun)(?:day|sday|nesday|rsday|urday|s|r|rs)?\b", re.IGNORECASE
+)
+_WEEK_PATTERN = re.compile(r"\b(?:week\s*(1|2|one|two)|(this|next)\s+week)\b", re.IGNORECASE)
+_EMPTY_PATTERN = re.compile(
+    r"\b(which|what)\s+days?\b.*\b(empty|free|rest|off|no workouts?|nothing)\b", re.IGNORECASE
+)
+_COUNT_WORKOUTS_PATTERN = re.compile(r"\bhow many\s+(workouts?|sessions?|trainings?)\b", re.IGNORECASE)
+_COUNT_EXERCISES_PATTERN = re.compile(r"\bhow many\s+(exercises?|sets)\b", re.IGNORECASE)
+_FIND_PATTERN = re.compile(
+    r"\b(?:what|which)\s+days?\s+(?:is|are|has|have)\s+(?:the\s+|a\s+|an\s+)?(.+?)(?:\s+workouts?|\s+sessions?)?\s*\??$"
+    r"|\bwhen\s+(?:is|are)\s+(?:the\s+|a\s+|an\s+)?(.+?)(?:\s+workouts?|\s+sessions?)?\s*\??$",
+    re.IGNORECASE,
+)
+# Without one of these words (or an empty-days question) a question is left to
+# the vision model, so unrelated screens never pay for a calendar extraction.
+_CALENDAR_TERMS_PATTERN = re.compile(
+    r"\b(workouts?|sessions?|trainings?|exercises?|sets|programs?|week(?:s|ly)?|rest\s+days?)\b", re.IGNORECASE
+)
+# Rankings need judgement the calendar JSON cannot answer locally.
+_SUPERLATIVE_PATTERN = re.compile(
+    r"\b(most|least|fewest|best|worst|hardest|easiest|toughest|longest|shortest|heaviest|lightest|biggest|"
+    r"smallest|busiest|quietest|highest|lowest|max(?:imum)?|min(?:imum)?)\b",
+    re.IGNORECASE,
+)
+_DATE_FORMATS = ("%b %d", "%B %d", "%d %b", "%d %B", "%m/%d", "%b %d, %Y", "%B %d, %Y", "%Y-%m-%d")
+_ON_DAY_PATTERN = re.compile(
+    r"\bwhat(?:'s| is| are)?\s+(?:workouts?\s+)?(?:is\s+|are\s+)?(?:scheduled\s+|planned\s+)?on\b", re.IGNORECASE
+)
+
+
+def _parse_week(question: str) -> tuple[Optional[int], Optional[str]]:
+    """Return ``(week row, relative week)``; "this/next week" depends on the calendar's dates."""
+    match = _WEEK_PATTERN.search(question)
+    if not match:
+        return None, None
+    number, relative = match.groups()
+    if number:
+        return (1 if number.lower() in ("1", "one") else 2), None
+    return None, relative.lower()
+
+
+def _parse_date(text: Any, today: date) -> Optional[date]:
+    """Parse a day cell's date ("Oct 20"); a missing year is the one nearest ``today``."""
+    if not isinstance(text, str):
+        return None
+    for format in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text.strip(), format).date()
+        except ValueError:
+            continue
+        if "%Y" in format:
+            return parsed
+        candidates = []
+        for year in (today.year - 1, today.year, today.year + 1):
+            with contextlib.suppress(ValueError):  # Feb 29
+                candidates.append(parsed.replace(year=year))
+        return min(candidates, key=lambda candidate: abs(candidate - today), default=None)
+    return None
+
+
+def _current_week(calendar: dict[str, Any], today: date) -> Optional[int]:
+    """The week row whose Monday-Sunday span contains ``today``, if the dates show it."""
+    for week_entry in calendar["weeks"]:
+        for day_entry in week_entry["days"]:
+            parsed = _parse_date(day_entry.get("date"), today)
+            name = day_entry["day"].capitalize()
+            if parsed is None or name not in DAYS:
+                continue
+            monday = parsed - timedelta(days=DAYS.index(name))
+            if monday <= today <= monday + timedelta(days=6):
+                return week_entry["week"]
+            break  # one dated day is enough to place the row
+    return None
+
+
+def _parse_day(question: str) -> Optional[str]:
+    match = _DAY_PATTERN.search(question)
+    if not match:
+        return None
+    prefix = match.group(1).lower()
+    return next(day for day in DAYS if day.lower().startswith(prefix))
+
+
+def parse_calendar_question(question: str) -> Optional[CalendarQuestion]:
+    """Recognise the question shapes that can be answered from the calendar JSON."""
+    if not (_CALENDAR_TERMS_PATTERN.search(question) or _EMPTY_PATTERN.search(question)):
+        return None
+    if _SUPERLATIVE_PATTERN.search(question):
+        return None
+    week, relative_week = _parse_week(question)
+    day = _parse_day(question)
+
+    if _EMPTY_PATTERN.search(question):
+        return CalendarQuestion("empty_days", week=week, relative_week=relative_week)
+    if _COUNT_WORKOUTS_PATTERN.search(question):
+        return CalendarQuestion("count_workouts", week=week, day=day, relative_week=relative_week)
+    count_match = _COUNT_EXERCISES_PATTERN.search(question)
+    if count_match and day:
+        return CalendarQuestion(
+            "count_exercises", week=week, day=day, subject=count_match.group(1).lower(), relative_week=relative_week
+        )
+    if day and _ON_DAY_PATTERN.search(question):
+        return CalendarQuestion("workouts_on_day", week=week, day=day, relative_week=relative_week)
+    # Drop the week qualifier so it does not end up in the workout subject.
+    unqualified = re.sub(r"\s+(?:in|on|for)(\s*\?*)$", r"\1", _WEEK_PATTERN.sub("", question).strip())
+    match = _FIND_PATTERN.search(unqualified)
+    if match and not day:
+        subject = (match.group(1) or match.group(2) or "").strip(" ?")
+        if subject:
+            return CalendarQuestion("find_workout", week=week, subject=subject, relative_week=relative_week)
+    return None
+
+
+def _iter_days(calendar: dict[str, Any], week: Optional[int], day: Optional[str] = None):
+    for week_entry in calendar["weeks"]:
+        if week is not None and week_entry["week"] != week:
+            continue
+        for day_entry in week_entry["days"]:
+            if day is not None and day_entry["day"].lower() != day.lower():
+                continue
+            yield week_entry["week"], day_entry
+
+
+def _day_label(week: int, day_entry: dict[str, Any]) -> str:
+    date = f" ({day_entry['date']})" if day_entry.get("date") else ""
+    return f"Week {week} {day_entry['day']}{date}"
+
+
+def _scope(question: CalendarQuestion) -> str:
+    parts = []
+    if question.day:
+        parts.append(f"on {question.day}")
+    parts.append(f"in week {question.week}" if question.week else "in the two weeks shown")
+    return " ".join(parts)
+
+
+def answer_calendar_question(
+    calendar: dict[str, Any], question: CalendarQuestion, today: Optional[date] = None
+) -> Optional[str]:
+    """Answer ``question`` from the calendar JSON, or ``None`` to fall back to vision."""
+    if question.relative_week:
+        current = _current_week(calendar, today or date.today())
+        if current is None:
+            return None
+        week = current + (1 if question.relative_week == "next" else 0)
+        if not any(week_entry["week"] == week for week_entry in calendar["weeks"]):
+            return None
+        question = replace(question, week=week, relative_week=None)
+    if question.intent == "empty_days":
+        empty = [_day_label(week, day) for week, day in _iter_days(calendar, question.week) if not day["workouts"]]
+        if not empty:
+            return f"There are no empty days {_scope(question)}."
+        return f"Empty days {_scope(question)}: " + ", ".join(empty) + "."
+
+    if question.intent == "count_workouts":
+        days = list(_iter_days(calendar, question.week, question.day))
+        if not days:
+            return None
+        count = sum(len(day["workouts"]) for _, day in days)
+        return f"There {'is' if count == 1 else 'are'} {count} workout{'' if count == 1 else 's'} {_scope(question)}."
+
+    if question.intent == "count_exercises":
+        days = list(_iter_days(calendar, question.week, question.day))
+        if not days:
+            return None
+        exercises = [exercise for _, day in days for workout in day["workouts"] for exercise in workout["exercises"]]
+        if question.subject == "sets":
+            # Ranges such as "3-4" or unreadable counts are left to the vision model.
+            if not all(isinstance(exercise["sets"], int) for exercise in exercises):
+                return None
+            total = sum(exercise["sets"] for exercise in exercises)
+            return f"There are {total} sets {_scope(question)}."
+        return f"There are {len(exercises)} exercises {_scope(question)}."
+
+    if question.intent == "workouts_on_day":
+        lines = []
+        for week, day in _iter_days(calendar, question.week, question.day):
+            titles = [workout["title"] or "Untitled workout" for workout in day["workouts"]]
+            lines.append(f"{_day_label(week, day)}: " + (", ".join(titles) if titles else "no workouts"))
+        return "\n".join(lines) or None
+
+    if question.intent == "find_workout":
+        words = [word for word in re.findall(r"\w+", question.subject.lower()) if len(word) > 2]
+        if not words:
+            return None
+        matches = []
+        for week, day in _iter_days(calendar, question.week):
+            for workout in day["workouts"]:
+                haystack = " ".join(
+                    [workout["title"]] + [exercise["name"] for exercise in workout["exercises"]]
+                ).lower()
+                if all(word in haystack for word in words):
+                    matches.append(f"{_day_label(week, day)}: {workout['title'] or 'Untitled workout'}")
+        if not matches:
+            # The subject may be phrased differently on screen; let the vision model decide.
+            return None
+        return "\n".join(matches)
+
+    return None
@@ -1,28 +1,88 @@
+import sqlite3
 import sys
 import time
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QLineEdit, QLabel, QTextEdit, QFrame, QScrollArea, QDialog)
-from PySide6.QtCore import Qt, QThread, Signal, QTimer, QPropertyAnimation, QEasingCurve
-from PySide6.QtGui import QFont, QPalette, QColor, QIcon, QPainter, QBrush
-from mcp_client import floating_app_agent
+                             QLineEdit, QLabel, QTextEdit, QFrame, QScrollArea, QDialog, QListView)
+from PySide6.QtCore import (Qt, QThread, Signal, QTimer, QPropertyAnimation, QEasingCurve, QRect, QSettings, QEvent,
+                            QAbstractListModel, QModelIndex)
+from PySide6.QtGui import QFont, QPalette, QColor, QIcon, QPainter, QBrush, QPen, QGuiApplication, QKeySequence, QShortcut
+import profiling
+import tracing
+from env_config import env_flag
+from history_store import history
+from screen_capture import active_window_region, capture_screen
+
+# Capture in the UI process and hand frames to the MCP server via shared memory
+CAPTURE_IN_UI = env_flag("EVERLY_CAPTURE_IN_UI")
+
+CAPTURE_MODE_SHORTCUTS = {
+    "Ctrl+1": "full",
+    "Ctrl+2": "monitor",
+    "Ctrl+3": "window",
+    "Ctrl+4": "region",
+}
 
 class AnalysisThread(QThread):
     """Thread for running screenshot analysis to prevent UI freezing."""
     finished = Signal(str)
     error = Signal(str)
+    # Emitted once the screen has been captured, so Everly's dialogs stay out of the frame
+    captured = Signal()
     
-    def __init__(self, agent, question):
+    def __init__(self, agent, question, capture_mode="full", region=None, trace=None):
         super().__init__()
         self.agent = agent
         self.question = question
+        self.capture_mode = capture_mode
+        self.region = region
+        self.trace = trace
     
     def run(self):
         try:
-            result = self.agent.analyze_screenshot_with_question(self.question)
+            # QThread does not inherit the caller's context, so the trace is passed in.
+            with profiling.profiled("AnalysisThread.run") as profile, \
+                    tracing.span("AnalysisThread.run", cat="ui", parent=self.trace, capture_mode=self.capture_mode):
+                if CAPTURE_IN_UI:
+                    with tracing.span("capture_screen", cat="capture"):
+                        image = capture_screen(self.capture_mode, self.region)
+                    self.captured.emit()
+                    result = self.agent.analyze_frame_with_question(self.question, image)
+                else:
+                    result = self.agent.analyze_screenshot_with_question(
+                        self.question, capture_mode=self.capture_mode, region=self.region,
+                        on_captured=self.captured.emit
+                    )
+            if profile is not None:
+                result = f"{result}\n\n{profile.describe()}"
             self.finished.emit(result)
         except Exception as e:
             self.error.emit(str(e))
 
+class AgentLoader(QThread):
+    """Import the MCP client and open its session off the UI thread.
+
+    ``mcp_client`` pulls in the MCP and anyio stacks, so it is loaded after the
+    floating bar has painted rather than before.
+    """
+    ready = Signal(object)
+    error = Signal(str)
+    
+    def run(self):
+        try:
+            with tracing.span("AgentLoader.import", cat="ui"):
+                from mcp_client import floating_app_agent
+        except Exception as e:
+            self.error.emit(f"Could not load the assistant: {e}")
+            return
+        try:
+            with tracing.span("AgentLoader.warm_up", cat="ui"):
+                floating_app_agent.warm_up()
+        except Exception as e:
+            # Not fatal: the first question connects again.
+            print(f"Warning: could not warm up the MCP session: {e}")
+        self.ready.emit(floating_app_agent)
+
+
 class TransparentWidget(QWidget):
     """Custom widget with transparent background."""
     def __init__(self):
@@ -382,15 +442,313 @@ class ResultDialog(QDialog):
         else:
             super().keyPressEvent(event)
 
-class FloatingWindow(QMainWindow):
+class HistoryModel(QAbstractListModel):
+    """Past questions and answers, fetched from the history store one page at a time.
+    
+    Only the pages scrolled into view are loaded, so the list stays responsive
+    with tens of thousands of entries.
+    """
+    PAGE_SIZE = 200
+    EntryRole = Qt.UserRole + 1
+    
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.search = ""
+        self.entries = []
+        self.exhausted = False
+    
+    def set_search(self, text):
+        """Restart the list for a new search (empty text lists everything)."""
+        self.beginResetModel()
+        self.search = text.strip()
+        self.entries = []
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        before_id = self.entries[-1].id if self.entries else None
+        try:
+            page = self.store.page(self.search, before_id, self.PAGE_SIZE)
+        except sqlite3.Error as e:
+            print(f"Could not read history: {e}")
+            page = []
+        self.exhausted = len(page) < self.PAGE_SIZE
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.entries), len(self.entries) + len(page) - 1)
+            self.entries.extend(page)
+            self.endInsertRows()
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            # Two single lines per entry keep every row the same height
+            when = time.strftime("%d/%m %H:%M", time.localtime(entry.ts))
+            question = " ".join(entry.question.split())
+            answer = " ".join(entry.answer.split())
+            return f"{when}  {question}\n{answer[:160]}"
+        if role == Qt.ToolTipRole:
+            return entry.answer
+        if role == self.EntryRole:
+            return entry
+        return None
+
+
+class HistoryDialog(QDialog):
+    """Searchable list of past answers; Enter reuses the selected one."""
+    reused = Signal(str, str)
+    
+    def __init__(self, parent=None, store=history):
+        super().__init__(parent)
+        self.setWindowTitle("History")
+        self.setWindowFlags(
+            Qt.FramelessWindowHint |
+            Qt.WindowStaysOnTopHint |
+            Qt.Tool
+        )
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setFixedSize(600, 400)
+        
+        # Position dialog centered below the input window
+        if parent:
+            center_x = parent.pos().x() + (parent.size().width() - self.width()) // 2
+            center_y = parent.pos().y() + parent.size().height() + 10
+            self.move(center_x, center_y)
+        
+        self.model = HistoryModel(store, self)
+        # Search as the user types, once typing pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(120)
+        self.search_timer.timeout.connect(self.run_search)
+        self.init_ui()
+        self.run_search()
+    
+    def init_ui(self):
+        """Initialize the history dialog UI."""
+        central_widget = TransparentWidget()
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(central_widget)
+        self.layout().setContentsMargins(0, 0, 0, 0)
+        
+        layout = QVBoxLayout(central_widget)
+        layout.setContentsMargins(20, 15, 20, 10)
+        layout.setSpacing(8)
+        
+        # Search field
+        self.search_field = QLineEdit()
+        self.search_field.setPlaceholderText("Search past questions and answers...")
+        self.search_field.setFont(QFont("SF Pro Display", 13))
+        self.search_field.setStyleSheet("""
+            QLineEdit {
+                border: none;
+                border-radius: 8px;
+                padding: 6px 10px;
+                background-color: rgba(255, 255, 255, 0.1);
+                color: white;
+            }
+        """)
+        self.search_field.textChanged.connect(self.search_timer.start)
+        self.search_field.returnPressed.connect(self.reuse_current)
+        self.search_field.installEventFilter(self)
+        layout.addWidget(self.search_field)
+        
+        # Virtualized list: uniform rows and lazily fetched pages
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setWordWrap(False)
+        self.list_view.setTextElideMode(Qt.ElideRight)
+        self.list_view.setFont(QFont("SF Pro Display", 11))
+        self.list_view.setStyleSheet("""
+            QListView {
+                border: none;
+                background-color: rgba(255, 255, 255, 0.05);
+                color: white;
+                border-radius: 10px;
+                padding: 4px;
+            }
+            QListView::item {
+                padding: 6px;
+                border-bottom: 1px solid rgba(255, 255, 255, 0.08);
+            }
+            QListView::item:selected {
+                background-color: rgba(255, 255, 255, 0.2);
+                border-radius: 6px;
+            }
+            QListView QScrollBar:vertical {
+                background-color: rgba(255, 255, 255, 0.1);
+                border-radius: 7px;
+                width: 8px;
+            }
+            QListView QScrollBar::handle:vertical {
+                background-color: rgba(255, 255, 255, 0.3);
+                border-radius: 7px;
+                min-height: 20px;
+            }
+        """)
+        self.list_view.activated.connect(self.reuse_index)
+        layout.addWidget(self.list_view)
+        
+        hint = QLabel("↑↓ to choose · Enter to reuse · Esc to close")
+        hint.setAlignment(Qt.AlignCenter)
+        hint.setFont(QFont("SF Pro Display", 10))
+        hint.setStyleSheet("color: rgba(255, 255, 255, 0.7);")
+        layout.addWidget(hint)
+        
+        self.search_field.setFocus()
+    
+    def run_search(self):
+        """Reload the list for the current search text and select the newest match."""
+        self.search_timer.stop()
+        self.model.set_search(self.search_field.text())
+        if self.model.rowCount():
+            self.list_view.setCurrentIndex(self.model.index(0))
+    
+    def eventFilter(self, obj, event):
+        """Let the arrow and page keys in the search field move the list selection."""
+        if obj is self.search_field and event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+                QApplication.sendEvent(self.list_view, event)
+                return True
+        return super().eventFilter(obj, event)
+    
+    def reuse_current(self):
+        """Reuse the selected entry (the search may still be pending)."""
+        if self.search_timer.isActive():
+            self.run_search()
+        self.reuse_index(self.list_view.currentIndex())
+    
+    def reuse_index(self, index):
+        entry = self.model.data(index, HistoryModel.EntryRole)
+        if entry is None:
+            return
+        self.reused.emit(entry.question, entry.answer)
+        self.close()
+    
+    def keyPressEvent(self, event):
+        """Handle key press events."""
+        if event.key() == Qt.Key_Escape:
+            self.close()
+        else:
+            super().keyPressEvent(event)
+
+
+class RegionSelectOverlay(QWidget):
+    """Full-desktop overlay for drawing the capture region with the mouse."""
+    region_selected = Signal(QRect)
+    cancelled = Signal()
+
     def __init__(self):
         super().__init__()
-        self.agent = floating_app_agent
+        self.setWindowFlags(
+            Qt.FramelessWindowHint |
+            Qt.WindowStaysOnTopHint |
+            Qt.Tool
+        )
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setCursor(Qt.CrossCursor)
+        self.origin = None
+        self.current = None
+
+        # Cover every monitor so the region can be drawn anywhere
+        self.setGeometry(QGuiApplication.primaryScreen().virtualGeometry())
+
+    def selection_rect(self):
+        """Return the selection in global (desktop) coordinates."""
+        if self.origin is None or self.current is None:
+            return QRect()
+        return QRect(self.origin, self.current).normalized()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0, 90))
+
+        selection = self.selection_rect()
+        if not selection.isNull():
+            local = selection.translated(-self.geometry().topLeft())
+            painter.setCompositionMode(QPainter.CompositionMode_Clear)
+            painter.fillRect(local, Qt.transparent)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            painter.setPen(QPen(QColor(255, 255, 255, 220), 2))
+            painter.drawRect(local)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.origin = event.globalPos()
+            self.current = self.origin
+            self.update()
+
+    def mouseMoveEvent(self, event):
+        if self.origin is not None:
+            self.current = event.globalPos()
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() != Qt.LeftButton or self.origin is None:
+            return
+        self.current = event.globalPos()
+        selection = self.selection_rect()
+        self.close()
+        # Ignore accidental clicks that did not draw anything meaningful
+        if selection.width() < 10 or selection.height() < 10:
+            self.cancelled.emit()
+        else:
+            self.region_selected.emit(selection)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.close()
+            self.cancelled.emit()
+        else:
+            super().keyPressEvent(event)
+
+class FloatingWindow(QMainWindow):
+    # Emitted once the bar has painted, and once the agent can take questions
+    first_frame = Signal()
+    agent_ready = Signal()
+    
+    def __init__(self, agent=None):
+        super().__init__()
+        # Without an agent one is loaded in the background after the first paint
+        self.agent = agent
+        self.agent_loader = None
+        self.pending_question = None
+        self.first_frame_shown = False
         self.analysis_thread = None
         self.result_dialog = None
+        self.history_dialog = None
+        self.last_result = None
         self.thinking_dialog = None
         self.query_dialog = None
         self.current_query = None
+        self.current_trace = None
+        self.region_overlay = None
+        # The thinking dialog waits for the capture, or for this timer if the capture is slow
+        self.thinking_pending = False
+        self.capture_timer = QTimer(self)
+        self.capture_timer.setSingleShot(True)
+        self.capture_timer.setInterval(1000)
+        self.capture_timer.timeout.connect(self.on_captured)
+        # Window mode: the last foreground window that was not Everly's
+        self.last_window = None
+        self.window_timer = QTimer(self)
+        self.window_timer.setInterval(500)
+        self.window_timer.timeout.connect(self.track_active_window)
+        self.settings = QSettings("Everly", "FloatingAssistant")
+        self.capture_mode = self.settings.value("capture/mode", "full")
+        self.last_region = self.load_last_region()
         self.init_ui()
         
     def init_ui(self):
@@ -411,6 +769,7 @@ class FloatingWindow(QMainWindow):
         # Create central widget with transparent background
         self.central_widget = TransparentWidget()
         self.setCentralWidget(self.central_widget)
+        self.central_widget.installEventFilter(self)
         
         # Create layout
         layout = QVBoxLayout(self.central_widget)
@@ -443,8 +802,178 @@ class FloatingWindow(QMainWindow):
         self.input_field.returnPressed.connect(self.process_question)
         layout.addWidget(self.input_field)
         
+        # Capture mode shortcuts (Ctrl+R redraws the capture region)
+        for sequence, mode in CAPTURE_MODE_SHORTCUTS.items():
+            shortcut = QShortcut(QKeySequence(sequence), self)
+            shortcut.activated.connect(lambda mode=mode: self.set_capture_mode(mode))
+        redraw_shortcut = QShortcut(QKeySequence("Ctrl+R"), self)
+        redraw_shortcut.activated.connect(self.select_region)
+        history_shortcut = QShortcut(QKeySequence("Ctrl+H"), self)
+        history_shortcut.activated.connect(self.show_history)
+        self.update_placeholder()
+        
+        # Follow the foreground window while another application has focus
+        QGuiApplication.instance().applicationStateChanged.connect(self.on_application_state_changed)
+        self.on_application_state_changed(QGuiApplication.applicationState())
+        
         # Make window draggable
         self.old_pos = None
+    
+    def eventFilter(self, obj, event):
+        """Start loading the agent once the bar has been painted."""
+        if obj is self.central_widget and event.type() == QEvent.Paint and not self.first_frame_shown:
+            self.first_frame_shown = True
+            self.first_frame.emit()
+            QTimer.singleShot(0, self.load_agent)
+        return super().eventFilter(obj, event)
+    
+    def load_agent(self):
+        """Load the agent on a background thread unless it is loaded or loading."""
+        if self.agent is not None:
+            self.agent_ready.emit()
+            return
+        if self.agent_loader is not None:
+            return
+        self.agent_loader = AgentLoader()
+        self.agent_loader.ready.connect(self.on_agent_ready)
+        self.agent_loader.error.connect(self.on_agent_error)
+        self.agent_loader.start()
+    
+    def on_agent_ready(self, agent):
+        """Keep the loaded agent and run a question asked while it was loading."""
+        self.agent = agent
+        self.agent_loader = None
+        self.agent_ready.emit()
+        if self.pending_question is not None:
+            question, region, trace = self.pending_question
+            self.pending_question = None
+            self.begin_capture()
+            self.start_analysis(question, region, trace)
+    
+    def on_agent_error(self, error_msg):
+        """Report a failed load; the next question tries again."""
+        self.agent_loader = None
+        if self.pending_question is not None:
+            self.pending_question = None
+            self.show_error(error_msg)
+        else:
+            print(error_msg)
+    
+    def export_state(self):
+        """Snapshot what a hot reload carries over to the rebuilt window."""
+        result_visible = self.result_dialog is not None and self.result_dialog.isVisible()
+        return {
+            "pos": self.pos(),
+            "text": self.input_field.text(),
+            "current_query": self.current_query,
+            "last_result": self.last_result if result_visible else None,
+        }
+    
+    def restore_state(self, state):
+        """Apply a snapshot taken by ``export_state`` on the previous window."""
+        self.move(state["pos"])
+        self.input_field.setText(state.get("text", ""))
+        self.current_query = state.get("current_query")
+        if state.get("last_result") is not None:
+            self.show_result(state["last_result"])
+    
+    def load_last_region(self):
+        """Load the remembered capture region from settings."""
+        value = self.settings.value("capture/last_region")
+        if not value:
+            return None
+        try:
+            region = QRect(*(int(part) for part in value))
+        except (TypeError, ValueError):
+            return None
+        return region if region.isValid() else None
+    
+    def update_placeholder(self):
+        """Show the active capture mode in the input placeholder."""
+        if self.capture_mode == "full":
+            self.input_field.setPlaceholderText("Ask me anything...")
+        else:
+            self.input_field.setPlaceholderText(f"Ask me anything... ({self.capture_mode})")
+    
+    def set_capture_mode(self, mode):
+        """Switch capture mode; region mode asks for a region if none is remembered."""
+        self.capture_mode = mode
+        self.settings.setValue("capture/mode", mode)
+        self.update_placeholder()
+        self.on_application_state_changed(QGuiApplication.applicationState())
+        if mode == "region" and self.last_region is None:
+            self.select_region()
+    
+    def on_application_state_changed(self, state):
+        """Track the foreground window in window mode while Everly is not focused.
+        
+        Once the user clicks the floating bar, the foreground window is Everly's
+        own, so the window to capture is the one seen last before that.
+        """
+        if self.capture_mode == "window" and state != Qt.ApplicationActive:
+            self.track_active_window()
+            self.window_timer.start()
+        else:
+            self.window_timer.stop()
+    
+    def track_active_window(self):
+        """Remember the geometry of the current foreground window."""
+        region = active_window_region()
+        if region is not None:
+            self.last_window = region
+    
+    def select_region(self):
+        """Open the overlay so the user can draw a new capture region."""
+        self.region_overlay = RegionSelectOverlay()
+        self.region_overlay.region_selected.connect(self.on_region_selected)
+        self.region_overlay.cancelled.connect(self.on_region_cancelled)
+        self.region_overlay.show()
+        self.region_overlay.activateWindow()
+    
+    def on_region_selected(self, region):
+        """Remember the drawn region and switch to region capture."""
+        self.last_region = region
+        self.settings.setValue(
+            "capture/last_region", [region.x(), region.y(), region.width(), region.height()]
+        )
+        self.capture_mode = "region"
+        self.settings.setValue("capture/mode", "region")
+        self.update_placeholder()
+        self.input_field.setFocus()
+    
+    def on_region_cancelled(self):
+        """Fall back to full screen if region mode has nothing to capture."""
+        if self.capture_mode == "region" and self.last_region is None:
+            self.set_capture_mode("full")
+        self.input_field.setFocus()
+    
+    def to_capture_region(self, rect, screen=None):
+        """Convert a logical Qt rect into physical pixels for the screenshot backend.
+        
+        Each screen keeps its logical origin and scales from there by its own
+        ratio, so with mixed DPI only the screen containing the rect applies.
+        """
+        screen = screen or QGuiApplication.screenAt(rect.center()) or self.screen()
+        ratio = screen.devicePixelRatio()
+        origin = screen.geometry().topLeft()
+        return [
+            int(origin.x() + (rect.x() - origin.x()) * ratio),
+            int(origin.y() + (rect.y() - origin.y()) * ratio),
+            int(rect.width() * ratio),
+            int(rect.height() * ratio),
+        ]
+    
+    def capture_region(self):
+        """Return the region to capture for the current mode, or None for the server default."""
+        if self.capture_mode == "monitor":
+            screen = self.screen()
+            return self.to_capture_region(screen.geometry(), screen)
+        if self.capture_mode == "region" and self.last_region is not None:
+            return self.to_capture_region(self.last_region)
+        if self.capture_mode == "window" and self.last_window is not None:
+            # Already in physical pixels, as reported by the window system
+            return list(self.last_window)
+        return None
         
     def mousePressEvent(self, event):
         """Handle mouse press for window dragging."""
@@ -494,20 +1023,71 @@ class FloatingWindow(QMainWindow):
         # Store current query
         self.current_query = question
         
-        # Clear input field
-        self.input_field.clear()
+        # Each question starts a new trace (recorded when EVERLY_TRACE is set)
+        with tracing.span("FloatingWindow.process_question", cat="ui", question=question) as trace:
+            self.current_trace = trace
+            
+            # Clear input field
+            self.input_field.clear()
+            
+            # Ask now, or as soon as the agent has loaded
+            if self.agent is None:
+                self.show_thinking_dialog()
+                self.pending_question = (question, self.capture_region(), trace)
+                self.load_agent()
+            else:
+                self.begin_capture()
+                self.start_analysis(question, self.capture_region(), trace)
+    
+    def begin_capture(self):
+        """Clear Everly's dialogs off the screen until the question's screenshot is taken.
         
-        # Show thinking dialog
+        Otherwise the capture shows the question and the animated dots, and no
+        two captures of the same screen hash alike.
+        """
+        if self.result_dialog:
+            self.result_dialog.close()
+        if self.thinking_dialog:
+            self.thinking_dialog.stop_animation()
+            self.thinking_dialog.close()
+        # No blinking cursor in the frame either
+        self.input_field.clearFocus()
+        self.thinking_pending = True
+        self.capture_timer.start()
+    
+    def on_captured(self):
+        """Show the thinking dialog once the screen is captured (or the fallback timer fires)."""
+        if not self.thinking_pending:
+            return
+        self.thinking_pending = False
+        self.capture_timer.stop()
         self.show_thinking_dialog()
-        
-        # Start analysis in separate thread
-        self.analysis_thread = AnalysisThread(self.agent, question)
+    
+    def start_analysis(self, question, region, trace):
+        """Run the question on a separate thread."""
+        self.analysis_thread = AnalysisThread(self.agent, question, self.capture_mode, region, trace)
+        self.analysis_thread.captured.connect(self.on_captured)
         self.analysis_thread.finished.connect(self.show_result)
         self.analysis_thread.error.connect(self.show_error)
         self.analysis_thread.start()
     
 
     
+    def show_history(self):
+        """Open the searchable history of past answers."""
+        if self.history_dialog:
+            self.history_dialog.close()
+        self.history_dialog = HistoryDialog(self)
+        self.history_dialog.reused.connect(self.reuse_answer)
+        self.history_dialog.show()
+        self.history_dialog.activateWindow()
+    
+    def reuse_answer(self, question, answer):
+        """Show a past answer again without asking the model."""
+        self.current_query = question
+        self.current_trace = None
+        self.show_result(answer)
+    
     def show_thinking_dialog(self):
         """Show the thinking dialog."""
         # Close existing dialogs if any
@@ -533,6 +1113,14 @@ class FloatingWindow(QMainWindow):
     
     def show_result(self, result):
         """Show the analysis result in a separate dialog."""
+        with tracing.span("FloatingWindow.show_result", cat="ui", parent=self.current_trace):
+            self._show_result(result)
+    
+    def _show_result(self, result):
+        # A question that failed before its capture never shows the thinking dialog
+        self.thinking_pending = False
+        self.capture_timer.stop()
+        
         # Close thinking dialog if any
         if self.thinking_dialog:
             self.thinking_dialog.stop_animation()
@@ -543,6 +1131,7 @@ class FloatingWindow(QMainWindow):
             self.result_dialog.close()
         
         # Create and show result dialog with query
+        self.last_result = result
         self.result_dialog = ResultDialog(result, self, self.current_query)
         self.result_dialog.show()
         
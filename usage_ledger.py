@@ -0,0 +1,267 @@
+"""Persistent usage and cost ledger for upstream calls, with a report CLI.
+
+Every OpenAI and webhook call is appended to a local SQLite database. Records
+go onto an in-memory queue and a background thread writes them in batches,
+so callers never wait on disk I/O.
+
+Usage:
+    python usage_ledger.py report [--by tool|model|hour] [--since 24h] [--db PATH]
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+from env_config import env_flag, env_float, env_int
+from session_recorder import recorder
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+LEDGER_PATH = Path(os.getenv("EVERLY_USAGE_DB", PROJECT_ROOT / ".everly_cache" / "usage.sqlite3"))
+LEDGER_ENABLED = env_flag("EVERLY_USAGE_LEDGER", True)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    tool TEXT NOT NULL,
+    model TEXT,
+    latency_ms REAL NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    image_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts);
+"""
+
+_COLUMNS = (
+    "ts",
+    "tool",
+    "model",
+    "latency_ms",
+    "input_tokens",
+    "output_tokens",
+    "image_tokens",
+    "cost_usd",
+    "status",
+)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Input tokens for a high-detail image under OpenAI's tiling rules (GPT-4o family)."""
+    if width <= 0 or height <= 0:
+        return 0
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    # WAL lets the UI, MCP server and report CLI read and write concurrently.
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class UsageLedger:
+    """Queue-backed SQLite writer; ``record`` only enqueues."""
+
+    def __init__(
+        self,
+        path: Path = LEDGER_PATH,
+        enabled: bool = LEDGER_ENABLED,
+        batch_size: int = env_int("EVERLY_USAGE_BATCH", 50),
+        flush_interval: float = env_float("EVERLY_USAGE_FLUSH_INTERVAL", 2.0),
+    ) -> None:
+        self.path = path
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[Optional[tuple]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def record(
+        self,
+        tool: str,
+        model: Optional[str] = None,
+        latency_s: float = 0.0,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        image_tokens: int = 0,
+        cost_usd: float = 0.0,
+        status: str = "ok",
+    ) -> None:
+        # Upstream timings of recorded sessions drive the replay stand-ins.
+        recorder.upstream(tool, model, latency_s, input_tokens, output_tokens, status)
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        self._queue.put(
+            (
+                time.time(),
+                tool,
+                model,
+                latency_s * 1000,
+                input_tokens,
+                output_tokens,
+                image_tokens,
+                cost_usd,
+                status,
+            )
+        )
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="usage-ledger", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_loop(self) -> None:
+        connection = _connect(self.path)
+        insert = f"INSERT INTO usage ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        stopping = False
+        while not stopping:
+            batch: list[tuple] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                with connection:
+                    connection.executemany(insert, batch)
+        connection.close()
+
+    def close(self) -> None:
+        """Flush queued records and stop the writer thread."""
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            return
+        self._queue.put(None)
+        writer.join(timeout=5)
+
+
+ledger = UsageLedger()
+
+
+# ===== Report CLI =====
+
+_GROUPS = {
+    "tool": "tool",
+    "model": "COALESCE(model, '-')",
+    "hour": "strftime('%Y-%m-%d %H:00', ts, 'unixepoch', 'localtime')",
+}
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _parse_since(value: str) -> float:
+    units = {"m": 60, "h": 3600, "d": 86400}
+    if value and value[-1] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def build_report(path: Path, by: str = "tool", since: Optional[float] = None) -> list[dict[str, Any]]:
+    """Aggregate ledger rows into one summary per ``by`` group."""
+    connection = _connect(path)
+    query = f"SELECT {_GROUPS[by]}, latency_ms, input_tokens, output_tokens, image_tokens, cost_usd, status FROM usage"
+    parameters: tuple = ()
+    if since is not None:
+        query += " WHERE ts >= ?"
+        parameters = (since,)
+
+    groups: dict[str, dict[str, Any]] = {}
+    for key, latency, input_tokens, output_tokens, image_tokens, cost, status in connection.execute(query, parameters):
+        group = groups.setdefault(
+            key,
+            {"group": key, "calls": 0, "errors": 0, "latencies": [], "input_tokens": 0,
+             "output_tokens": 0, "image_tokens": 0, "cost_usd": 0.0},
+        )
+        group["calls"] += 1
+        group["errors"] += status != "ok"
+        group["latencies"].append(latency)
+        group["input_tokens"] += input_tokens
+        group["output_tokens"] += output_tokens
+        group["image_tokens"] += image_tokens
+        group["cost_usd"] += cost
+    connection.close()
+
+    report = []
+    for key in sorted(groups):
+        group = groups[key]
+        latencies = group.pop("latencies")
+        group["p50_ms"] = _percentile(latencies, 50)
+        group["p95_ms"] = _percentile(latencies, 95)
+        report.append(group)
+    return report
+
+
+def _print_report(report: list[dict[str, Any]], by: str) -> None:
+    header = f"{by:<24} {'calls':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'in tok':>10} {'out tok':>9} {'img tok':>9} {'cost $':>10}"
+    print(header)
+    print("-" * len(header))
+    totals = {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "image_tokens": 0, "cost_usd": 0.0}
+    for row in report:
+        print(
+            f"{str(row['group'])[:24]:<24} {row['calls']:>6} {row['errors']:>6} {row['p50_ms']:>9.0f} "
+            f"{row['p95_ms']:>9.0f} {row['input_tokens']:>10} {row['output_tokens']:>9} "
+            f"{row['image_tokens']:>9} {row['cost_usd']:>10.4f}"
+        )
+        for key in totals:
+            totals[key] += row[key]
+    print("-" * len(header))
+    print(
+        f"{'total':<24} {totals['calls']:>6} {totals['errors']:>6} {'':>9} {'':>9} {totals['input_tokens']:>10} "
+        f"{totals['output_tokens']:>9} {totals['image_tokens']:>9} {totals['cost_usd']:>10.4f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Everly usage and cost ledger")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    report_parser = subcommands.add_parser("report", help="summarise latency, tokens and cost")
+    report_parser.add_argument("--by", choices=sorted(_GROUPS), default="tool")
+    report_parser.add_argument("--since", help="e.g. 30m, 24h, 7d or an ISO date")
+    report_parser.add_argument("--db", type=Path, default=LEDGER_PATH)
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        parser.exit(1, f"No usage recorded yet ({args.db} does not exist).\n")
+    since = _parse_since(args.since) if args.since else None
+    _print_report(build_report(args.db, args.by, since), args.by)
+
+
+if __name__ == "__main__":
+    main()